@@ -0,0 +1 @@
+# бенчмарки та навантажувальні сценарії: python -m benchmarks.<seed|repository|load|compare> --help
@@ -0,0 +1,58 @@
+# спільне для бенчмарків: перцентилі та звіт у JSON (для порівняння між комітами)
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+
+def percentile(ordered: List[float], share: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not ordered:
+        return 0.0
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def summarize(samples: List[float], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """Latency summary of the samples (seconds) in ms, with throughput if the wall time is known."""
+    ordered = sorted(samples)
+    summary = {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'min_ms': round(ordered[0] * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(ordered) / elapsed, 2)
+    return summary
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_report(name: str, parameters: Dict[str, Any], results: Dict[str, Any], output: Optional[str]) -> None:
+    """The report to the output file (or stdout): what was run, on which commit, and the results."""
+    report = {
+        'benchmark': name,
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'parameters': parameters,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
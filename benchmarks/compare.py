@@ -0,0 +1,38 @@
+# порівняння двох звітів (наприклад, двох комітів): python -m benchmarks.compare old.json new.json
+import argparse
+import json
+
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return '-'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare two JSON reports of the same benchmark.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    args = parser.parse_args()
+
+    with open(args.old) as fh:
+        old = json.load(fh)
+    with open(args.new) as fh:
+        new = json.load(fh)
+
+    print(f'{old["benchmark"]}: {old["commit"]} -> {new["commit"]}')
+    print(f'{"":45}' + ''.join(f'{metric:>26}' for metric in METRICS))
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        cells = [f'{before.get(m, 0):>10} -> {result.get(m, 0):<8} {_change(before.get(m, 0), result.get(m, 0)):>6}'
+                 if m in result else f'{"":26}' for m in METRICS]
+        print(f'{name:45}' + ''.join(cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# навантажувальний сценарій HTTP: суміш get/create/like-пошуку/днів народження/сторінок, python -m benchmarks.load
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx  # poetry install --with dev
+
+from benchmarks.common import summarize, write_report
+
+
+DEFAULT_MIX = 'get=40,list=20,like=20,birthday=10,create=10'
+_numbers = itertools.count(int(time.time()))  # unique created contacts between the runs
+
+
+def _get(ids: List[int]) -> Tuple[str, str, Any]:
+    return 'GET', f'/api/contacts/{random.choice(ids)}', None
+
+
+def _list(ids: List[int]) -> Tuple[str, str, Any]:
+    return 'GET', f'/api/contacts/?page={random.randint(1, 20)}&size=50', None
+
+
+def _like(ids: List[int]) -> Tuple[str, str, Any]:
+    return 'GET', f'/api/contacts/search_by_like_name/{random.choice(("an", "ol", "ia", "ro", "yu"))}', None
+
+
+def _birthday(ids: List[int]) -> Tuple[str, str, Any]:
+    return 'GET', f'/api/contacts/search_by_birthday_celebration_within_days/{random.choice((0, 7, 30))}', None
+
+
+def _create(ids: List[int]) -> Tuple[str, str, Any]:
+    number = next(_numbers)
+    body = {'name': 'Load', 'last_name': f'load{number}', 'email': f'load{number}@example.com',
+            'phone': 1000000000 + number % 1000000000, 'birthday': '1990-01-01', 'description': 'load test'}
+    return 'POST', '/api/contacts/', body
+
+
+OPERATIONS: Dict[str, Callable[[List[int]], Tuple[str, str, Any]]] = {
+    'get': _get, 'list': _list, 'like': _like, 'birthday': _birthday, 'create': _create,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(','):
+        name, weight = part.split('=')
+        if name not in OPERATIONS:
+            raise SystemExit(f'Unknown operation {name!r}, expected: {", ".join(OPERATIONS)}')
+        weights[name] = int(weight)
+    return weights
+
+
+async def contact_ids(client: httpx.AsyncClient, limit: int = 1000) -> List[int]:
+    """Ids of existing contacts for the get operation (the first pages of the keyset listing)."""
+    ids, cursor = [], None
+    while len(ids) < limit:
+        params = {'size': 100, **({'cursor': cursor} if cursor else {})}
+        page = (await client.get('/api/contacts/keyset/', params=params)).json()
+        ids += [item['id'] for item in page['items']]
+        cursor = page.get('next_cursor')
+        if not cursor:
+            break
+    return ids
+
+
+async def worker(client: httpx.AsyncClient, weights: Dict[str, int], ids: List[int], deadline: float,
+                 timings: Dict[str, List[float]], statuses: Dict[str, Dict[int, int]]) -> None:
+    names, chances = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        name = random.choices(names, chances)[0]
+        method, url, body = OPERATIONS[name](ids)
+        start = time.perf_counter()
+        try:
+            status = (await client.request(method, url, json=body)).status_code
+        except httpx.HTTPError:
+            status = 0  # no response (connection error, timeout)
+        timings[name].append(time.perf_counter() - start)
+        statuses[name][status] += 1
+
+
+async def run(base_url: str, duration: float, concurrency: int, weights: Dict[str, int], in_process: bool) -> Dict[str, Any]:
+    if in_process:  # the app of main.py in this process, no server (and no network) in between
+        from main import app
+        from src.database.db_connect import database
+        database.connect()  # ASGITransport runs no lifespan
+        transport = httpx.ASGITransport(app=app)
+    else:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=concurrency))
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30) as client:
+        ids = await contact_ids(client)
+        if not ids:
+            raise SystemExit('No contacts: seed the database first (python -m benchmarks.seed)')
+
+        timings: Dict[str, List[float]] = defaultdict(list)
+        statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(client, weights, ids, started + duration, timings, statuses)
+                               for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    results = {name: {**summarize(samples, elapsed), 'statuses': dict(statuses[name])}
+               for name, samples in timings.items()}
+    errors = sum(count for codes in statuses.values() for code, count in codes.items() if code == 0 or code >= 500)
+    results['total'] = {**summarize([t for samples in timings.values() for t in samples], elapsed), 'errors': errors}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='HTTP load scenario against the contacts API.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='the running app (uvicorn main:app)')
+    parser.add_argument('--in-process', action='store_true', help='call the app of main.py without a server')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--concurrency', type=int, default=20, help='simultaneous clients')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'operations and their weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--output', help='JSON report file (default: stdout)')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.base_url, args.duration, args.concurrency, parse_mix(args.mix), args.in_process))
+    total = results['total']
+    print(f'{total["count"]} requests, {total["throughput_rps"]} rps, p50 {total["p50_ms"]} ms, '
+          f'p99 {total["p99_ms"]} ms, {total["errors"]} errors', file=sys.stderr)
+    write_report('load', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
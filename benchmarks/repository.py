@@ -0,0 +1,172 @@
+# мікробенчмарки функцій src/repository/contacts.py, python -m benchmarks.repository --iterations 50
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from fastapi_pagination import Page, Params
+from fastapi_pagination.api import _params_val, set_page  # the context add_pagination sets for a route
+from sqlalchemy import delete, select
+
+from benchmarks.common import summarize, write_report
+from src.database.db_connect import database, get_db_session
+from src.database.models import Contact
+from src.repository import contacts as repository_contacts
+from src.schemes import CatToNameModel, ContactModel, ContactPartialModel, ContactResponse, CursorParams, ExportFilters
+
+
+BENCH_PREFIX = 'bench'  # the contacts created by the write benchmarks (deleted at the end)
+
+
+class Sample:
+    """Existing contacts to look up and search for, and the ids of the contacts created by the benchmark."""
+
+    def __init__(self, rows: List[Any]) -> None:
+        self.rows = rows
+        self.created: List[int] = []
+        self.counter = 0
+
+    def row(self) -> Any:
+        return random.choice(self.rows)
+
+    def new_contact(self) -> ContactModel:
+        self.counter += 1
+        return ContactModel(name='Bench', last_name=f'{BENCH_PREFIX}{self.counter}',
+                            email=f'{BENCH_PREFIX}{self.counter}@example.com', phone=2000000000 + self.counter,
+                            birthday='1990-01-01', description='benchmark')
+
+
+async def _remove_created() -> None:
+    """The contacts created by the benchmark (also by an interrupted run)."""
+    async for db in get_db_session():
+        await db.execute(delete(Contact).filter(Contact.last_name.startswith(BENCH_PREFIX)))
+        await db.commit()
+
+
+async def _bulk_records(sample: Sample, size: int) -> AsyncIterator[Any]:
+    for row in range(1, size + 1):
+        yield row, sample.new_contact().dict()
+
+
+async def _export(filters: ExportFilters, db: Any) -> int:
+    return sum([len(chunk) async for chunk in repository_contacts.export_contacts(filters, 'ndjson', db)])
+
+
+async def _update(sample: Sample, db: Any) -> Any:
+    return await repository_contacts.update_contact(random.choice(sample.created), sample.new_contact(), db)
+
+
+async def _remove(sample: Sample, db: Any) -> Any:
+    return await repository_contacts.remove_contact(sample.created.pop(), db)
+
+
+async def _create(sample: Sample, db: Any) -> Any:
+    contact = await repository_contacts.create_contact(sample.new_contact(), db)
+    sample.created.append(contact.id)
+    return contact
+
+
+# name: (sample, db) -> awaitable; the writes go last, in this order (remove deletes what create added)
+CASES: Dict[str, Callable[[Sample, Any], Awaitable[Any]]] = {
+    'get_contacts': lambda s, db: repository_contacts.get_contacts(db),
+    'get_contact': lambda s, db: repository_contacts.get_contact(s.row().id, db),
+    'search_by_name': lambda s, db: repository_contacts.search_by_name(s.row().name, db),
+    'search_by_last_name': lambda s, db: repository_contacts.search_by_last_name(s.row().last_name, db),
+    'search_by_email': lambda s, db: repository_contacts.search_by_email(s.row().email, db),
+    'search_by_phone': lambda s, db: repository_contacts.search_by_phone(s.row().phone, db),
+    'search_by_like_name': lambda s, db: repository_contacts.search_by_like_name(s.row().name[:3], db),
+    'search_by_like_last_name': lambda s, db: repository_contacts.search_by_like_last_name(s.row().last_name[-3:], db),
+    'search_by_like_email': lambda s, db: repository_contacts.search_by_like_email(s.row().email[:5], db),
+    'search_by_like_phone': lambda s, db: repository_contacts.search_by_like_phone(int(str(s.row().phone)[-4:]), db),
+    'search': lambda s, db: repository_contacts.search(s.row().name[:3], db),
+    'get_contacts_keyset': lambda s, db: repository_contacts.get_contacts_keyset(CursorParams(size=50), db),
+    'search_by_like_name_keyset':
+        lambda s, db: repository_contacts.search_by_like_name_keyset(s.row().name[:3], CursorParams(size=50), db),
+    'search_by_like_last_name_keyset':
+        lambda s, db: repository_contacts.search_by_like_last_name_keyset(s.row().last_name[-3:], CursorParams(size=50), db),
+    'search_by_like_email_keyset':
+        lambda s, db: repository_contacts.search_by_like_email_keyset(s.row().email[:5], CursorParams(size=50), db),
+    'search_by_like_phone_keyset':
+        lambda s, db: repository_contacts.search_by_like_phone_keyset(int(str(s.row().phone)[-4:]), CursorParams(size=50), db),
+    'search_by_birthday_celebration_within_days':
+        lambda s, db: repository_contacts.search_by_birthday_celebration_within_days(random.choice((0, 7, 30)), db),
+    'search_by_birthday_celebration_within_days_keyset':
+        lambda s, db: repository_contacts.search_by_birthday_celebration_within_days_keyset(
+            random.choice((7, 30, 366)), CursorParams(size=50), db),
+    'export_contacts': lambda s, db: _export(ExportFilters(birthday_within_days=7), db),
+    'create_contact': _create,
+    'create_contacts_bulk': lambda s, db: repository_contacts.create_contacts_bulk(_bulk_records(s, 1000), db),
+    'update_contact': _update,
+    'change_name_contact': lambda s, db: repository_contacts.change_name_contact(CatToNameModel(name='Renamed'),
+                                                                                random.choice(s.created), db),
+    'patch_contact': lambda s, db: repository_contacts.patch_contact(random.choice(s.created),
+                                                                    ContactPartialModel(description='patched'), db),
+    'remove_contact': _remove,
+}
+
+
+async def measure(case: Callable[[Sample, Any], Awaitable[Any]], sample: Sample,
+                  iterations: int, warmup: int) -> Dict[str, Any]:
+    timings = []
+    started = time.perf_counter()
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        async for db in get_db_session():  # a session of the configured mode (async or offload), as in a route
+            await case(sample, db)
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+        else:
+            started = time.perf_counter()
+
+    return summarize(timings, time.perf_counter() - started)
+
+
+async def run(iterations: int, warmup: int, page_size: int, cache: bool, only: Optional[List[str]]) -> Dict[str, Any]:
+    if not cache:  # the database path, not the cache hits
+        repository_contacts.contact_cache = None
+
+    database.connect()  # as the lifespan of the application: the engines, and pg_trgm of each database
+    await _remove_created()
+    async for db in get_db_session():
+        rows = (await db.execute(select(Contact.id, Contact.name, Contact.last_name, Contact.email, Contact.phone)
+                                 .limit(1000))).all()
+    if not rows:
+        raise SystemExit('No contacts: seed the database first (python -m benchmarks.seed)')
+
+    sample = Sample(rows)
+    results = {}
+    _params_val.set(Params(page=1, size=page_size))
+    with set_page(Page[ContactResponse]):
+        for name, case in CASES.items():
+            if only and name not in only:
+                continue
+            if name in ('update_contact', 'change_name_contact', 'patch_contact') and not sample.created:
+                await measure(_create, sample, iterations, 0)
+            if name == 'remove_contact':  # something to remove in every iteration
+                while len(sample.created) < iterations + warmup:
+                    await measure(_create, sample, 1, 0)
+            results[name] = await measure(case, sample, iterations, warmup)
+            print(f'{name}: p50 {results[name]["p50_ms"]} ms, p99 {results[name]["p99_ms"]} ms', file=sys.stderr)
+
+    await _remove_created()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the repository functions.')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=50, help='size of the pages (fastapi_pagination)')
+    parser.add_argument('--cache', action='store_true', help='keep the contact cache (default: measure the database)')
+    parser.add_argument('--only', nargs='*', choices=list(CASES), help='run only these functions')
+    parser.add_argument('--output', help='JSON report file (default: stdout)')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations, args.warmup, args.page_size, args.cache, args.only))
+    write_report('repository', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
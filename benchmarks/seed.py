@@ -0,0 +1,81 @@
+# генератор даних: N контактів (1k - 10M) одним COPY, python -m benchmarks.seed --count 100000
+import argparse
+import io
+import random
+import time
+from datetime import date, timedelta
+from typing import Iterator
+
+from src.database.db_connect import database
+
+
+NAMES = ('Anna', 'Bohdan', 'Daria', 'Dmytro', 'Iryna', 'Ivan', 'Kateryna', 'Maksym', 'Maria', 'Mykola',
+         'Oksana', 'Oleh', 'Olena', 'Petro', 'Roman', 'Sofia', 'Taras', 'Viktoria', 'Yulia', 'Yurii')
+PHONE_BASE = 100000000  # + the number of the contact: unique, within Integer for 10M contacts
+COPY_SQL = 'COPY contacts (name, last_name, email, phone, birthday, description) FROM STDIN WITH (FORMAT csv)'
+
+
+def generate_rows(start: int, count: int, seed: int) -> Iterator[str]:
+    """CSV lines of the contacts start ... start + count - 1, unique (email, phone, name + last name) by the number."""
+    rnd = random.Random(seed)
+    first_day = date(1950, 1, 1)
+    for number in range(start, start + count):
+        name = rnd.choice(NAMES)
+        birthday = first_day + timedelta(days=rnd.randrange(365 * 55))
+        yield f'{name},Last{number},user{number}@example.com,{PHONE_BASE + number},{birthday},seeded\n'
+
+
+class RowStream(io.RawIOBase):
+    """A readable file over the generated lines, so COPY streams them without keeping N rows in memory."""
+
+    def __init__(self, rows: Iterator[str]) -> None:
+        self.rows = rows
+        self.buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            chunk = ''.join(line for _, line in zip(range(1000), self.rows)).encode()
+            if not chunk:
+                break
+            self.buffer += chunk
+
+        data, self.buffer = (self.buffer, b'') if size < 0 else (self.buffer[:size], self.buffer[size:])
+        return data
+
+
+def seed(count: int, truncate: bool, random_seed: int) -> None:
+    connection = database.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if truncate:
+            cursor.execute('TRUNCATE contacts RESTART IDENTITY')
+        cursor.execute("SELECT coalesce(max(substring(last_name from 5)::int), 0) FROM contacts WHERE last_name ~ '^Last[0-9]+$'")
+        start = cursor.fetchone()[0] + 1  # seeding again adds new numbers, not duplicates
+        started = time.perf_counter()
+        # generated data, not changes: no row per contact in the change feed (in the same transaction as the COPY)
+        cursor.execute('ALTER TABLE contacts DISABLE TRIGGER contacts_log_change')
+        cursor.copy_expert(COPY_SQL, RowStream(generate_rows(start, count, random_seed)))
+        cursor.execute('ALTER TABLE contacts ENABLE TRIGGER contacts_log_change')
+        connection.commit()
+        cursor.execute('ANALYZE contacts')
+        connection.commit()
+        print(f'{count} contacts seeded in {time.perf_counter() - started:.1f} s (numbers {start} - {start + count - 1})')
+
+    finally:
+        connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Seed the contacts table with generated contacts.')
+    parser.add_argument('--count', type=int, default=10000, help='number of contacts (1k - 10M)')
+    parser.add_argument('--truncate', action='store_true', help='delete all the contacts first')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (the same data for the same seed)')
+    args = parser.parse_args()
+    seed(args.count, args.truncate, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# ORM + pydantic проти легкого шляху (кортежі колонок + orjson) для сторінок 50/500/5000, python -m benchmarks.serialization
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from fastapi_pagination import Page, Params
+from fastapi_pagination.api import _params_val, set_page  # the context add_pagination sets for a route
+from fastapi_pagination.ext.async_sqlalchemy import paginate
+from sqlalchemy import func, select
+
+from benchmarks.common import summarize, write_report
+from src.database.db_connect import get_db_session
+from src.database.models import Contact
+from src.repository.rows import orjson, paginate_rows, select_rows
+from src.schemes import ContactResponse
+
+
+PAGE_RESPONSE_FIELD = create_response_field(name='response', type_=Page[ContactResponse])
+
+
+async def orm_page(db: Any) -> bytes:
+    """The path before: ORM objects -> Page[ContactResponse] -> response_model validation -> JSONResponse."""
+    page = await paginate(db, select(Contact).order_by(Contact.name, Contact.id))
+    content = await serialize_response(field=PAGE_RESPONSE_FIELD, response_content=page)
+    return JSONResponse(content).body
+
+
+async def lean_page(db: Any) -> bytes:
+    """The lean path: column tuples -> RowPage -> orjson."""
+    page = await paginate_rows(db, select_rows().order_by(Contact.name, Contact.id))
+    return page.render()
+
+
+async def measure(path: Callable[[Any], Awaitable[bytes]], iterations: int, warmup: int) -> Dict[str, Any]:
+    timings = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        async for db in get_db_session():
+            await path(db)
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+
+    return summarize(timings)
+
+
+async def run(sizes: List[int], iterations: int, warmup: int) -> Dict[str, Any]:
+    async for db in get_db_session():
+        count = await db.scalar(select(func.count()).select_from(Contact))
+    if count < max(sizes):
+        raise SystemExit(f'{count} contacts, {max(sizes)} needed: python -m benchmarks.seed --count {max(sizes)}')
+
+    results = {}
+    with set_page(Page[ContactResponse]):
+        for size in sizes:
+            _params_val.set(Params.construct(page=1, size=size))  # construct: past the le=100 of the routes
+            async for db in get_db_session():
+                if json.loads(await orm_page(db)) != json.loads(await lean_page(db)):
+                    raise SystemExit(f'The lean path returns another page of {size}')
+
+            orm = await measure(orm_page, iterations, warmup)
+            lean = await measure(lean_page, iterations, warmup)
+            results[f'page_{size}'] = {'orm': orm, 'lean': lean,
+                                       'speedup_p50': round(orm['p50_ms'] / lean['p50_ms'], 2)}
+            print(f'page {size}: orm p50 {orm["p50_ms"]} ms, lean p50 {lean["p50_ms"]} ms, '
+                  f'x{results[f"page_{size}"]["speedup_p50"]}', file=sys.stderr)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Page serialization: ORM + pydantic against column rows + orjson.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='JSON report file (default: stdout)')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.sizes, args.iterations, args.warmup))
+    write_report('serialization', {**vars(args), 'orjson': orjson is not None}, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
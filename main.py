@@ -1,16 +1,63 @@
 # FastAPI + REST API example (Contacts)
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from contextlib import asynccontextmanager
+import logging
+from typing import AsyncIterator
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 import uvicorn
 
-from src.database.db_connect import get_db
-from src.routes import contacts
+from src.database.db_connect import database, offload_executor
+from src.database.health import database_health
+from src.metrics import MetricsMiddleware, render as render_metrics
+from src.profiling import ProfilingMiddleware, profiling_options
+from src.ratelimit import (
+    concurrency_limit_options,
+    ConcurrencyLimitMiddleware,
+    rate_limit_options,
+    RateLimitMiddleware,
+    )
+from src.repository.birthdays import birthday_roller
+from src.routes import contacts, health, stats
+from src.settings import config
+
+
+def configure_logging() -> None:
+    """[LOGGING] LEVEL (INFO by default) for the loggers of the application - in the lifespan of the worker, 
+    not on the import of main: the scripts, benchmarks and tests that import it keep their own logging."""
+    logging.basicConfig(level=config.get('LOGGING', 'level', fallback='INFO').upper(), format='%(threadName)s %(message)s')
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """The engines (and the password) are made here, once per worker - not on the import of the modules,
+    then the background roll forward of the next birthdays starts. At the shutdown (after the server has drained
+    the requests in flight) it is stopped and the pooled connections are closed."""
+    configure_logging()
+    database.connect()
+    birthday_roller.start()
+    yield
+    await birthday_roller.stop()
+    await database.dispose()
+    offload_executor.shutdown()
 
-app = FastAPI()  # our application
+
+app = FastAPI(lifespan=lifespan)  # our application
+# the last added middleware runs first: metrics -> profiling -> rate limit -> concurrency limit -> routes
+concurrency_limit = concurrency_limit_options()
+if concurrency_limit is not None:  # [CONCURRENCY] in config.ini: the overload is shed with 503
+    app.add_middleware(ConcurrencyLimitMiddleware, **concurrency_limit)
+rate_limit = rate_limit_options()
+if rate_limit is not None:  # [RATE_LIMIT] in config.ini: a client over its rate gets 429
+    app.add_middleware(RateLimitMiddleware, router=app.router, **rate_limit)
+profiling = profiling_options()
+if profiling is not None:  # [PROFILING] in config.ini: a request with the secret is profiled
+    app.add_middleware(ProfilingMiddleware, **profiling)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(contacts.router, prefix='/api')
+app.include_router(stats.router, prefix='/api')
+app.include_router(health.router, prefix='/api')
 
 
 @app.get("/")
@@ -18,20 +65,21 @@ async def root() -> dict:
     return {" Welcome! ": " The personal virtual assistant is ready to go, I'm kidding ^_^ "}
 
 
+# kept for the old clients: /api/health/ready (and /api/health/live) are the probes
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)) -> dict: 
-    """Check if the container (DB server) is up."""
-    try:
-        result = db.execute(text("SELECT 1")).fetchone()
-        if result is None:
-            raise HTTPException(status_code=500, detail="Database is not configured correctly!")
-        
-        return {"ALERT": "Welcome to FastAPI! System ready!"}
-    
-    except Exception as e:
-        print(e)
+async def healthchecker() -> dict: 
+    """Check if the container (DB server) is up - without a query of its own when the DB answered recently."""
+    if not await database_health.ready():
         raise HTTPException(status_code=500, detail="Error connecting to the database!")
 
+    return {"ALERT": "Welcome to FastAPI! System ready!"}
+
+
+# Prometheus scrape target: requests, latency per route, DB statements and DB time per request
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
 
-if __name__ == "__main__":
+if __name__ == "__main__":  # development: one process (production: python serve.py)
     uvicorn.run(app, host='127.0.0.1', port=8000)
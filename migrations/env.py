@@ -6,7 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from src.database.models import Base
-from src.database.db_connect import SQLALCHEMY_DATABASE_URL
+from src.database.db_connect import database_url
 
 
 # this is the Alembic Config object, which provides
@@ -28,7 +28,7 @@ target_metadata = Base.metadata
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
-config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
+config.set_main_option("sqlalchemy.url", database_url().replace("%", "%%"))  # % - interpolation of the .ini
 
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,27 @@
+"""Keyset index
+
+Revision ID: 5d1e7a3c9b20
+Revises: b45b1014f756
+Create Date: 2026-10-18 10:12:40.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1e7a3c9b20'
+down_revision = 'b45b1014f756'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():  # CONCURRENTLY: the table stays writable while the index is built
+        op.create_index('ix_contacts_name_id', 'contacts', ['name', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_name_id', table_name='contacts', postgresql_concurrently=True)
@@ -0,0 +1,72 @@
+"""Trigram search
+
+Revision ID: 8f3a2c6d1e47
+Revises: 5d1e7a3c9b20
+Create Date: 2026-10-18 12:40:07.553210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a2c6d1e47'
+down_revision = '5d1e7a3c9b20'
+branch_labels = None
+depends_on = None
+
+# ILIKE '%x%' can use only a GIN (gin_trgm_ops) index, never a btree one
+TRIGRAM_INDEXES = {
+    'ix_contacts_name_trgm': 'name',
+    'ix_contacts_last_name_trgm': 'last_name',
+    'ix_contacts_email_trgm': 'email',
+    'ix_contacts_phone_text_trgm': 'phone_text',
+}
+
+# phone_text is set by a trigger, not a stored generated column: adding one rewrites the whole table under lock
+SET_PHONE_TEXT_FUNCTION = """
+CREATE FUNCTION contacts_set_phone_text() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.phone_text := CAST(NEW.phone AS VARCHAR(10));
+    RETURN NEW;
+END
+$$
+"""
+
+# the backfill: short transactions by ranges of id, not one UPDATE that locks all the rows until the end
+BACKFILL_BATCH = 10000
+BACKFILL = ('UPDATE contacts SET phone_text = CAST(phone AS VARCHAR(10)) '
+            'WHERE id > :first AND id <= :first + :batch AND phone_text IS NULL')
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('phone_text', sa.String(length=10), nullable=True))
+    op.execute(SET_PHONE_TEXT_FUNCTION)
+    # the new and changed rows get it from now on, the backfill does the others
+    op.execute('CREATE TRIGGER contacts_phone_text BEFORE INSERT OR UPDATE OF phone ON contacts '
+               'FOR EACH ROW EXECUTE PROCEDURE contacts_set_phone_text()')
+
+    # without pg_trgm (e.g. a managed server without contrib) the searches still work, just without the index
+    has_trgm = op.get_bind().execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar()
+    if has_trgm:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    with op.get_context().autocommit_block():  # CONCURRENTLY: the table stays writable while the indexes are built
+        connection = op.get_bind()
+        last = connection.scalar(sa.text('SELECT max(id) FROM contacts')) or 0
+        for first in range(0, last, BACKFILL_BATCH):
+            connection.execute(sa.text(BACKFILL), {'first': first, 'batch': BACKFILL_BATCH})
+        if has_trgm:
+            for index, column in TRIGRAM_INDEXES.items():
+                op.create_index(index, 'contacts', [column], unique=False, postgresql_concurrently=True,
+                                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index in TRIGRAM_INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index}')
+
+    op.execute('DROP TRIGGER IF EXISTS contacts_phone_text ON contacts')
+    op.execute('DROP FUNCTION IF EXISTS contacts_set_phone_text()')
+    op.drop_column('contacts', 'phone_text')
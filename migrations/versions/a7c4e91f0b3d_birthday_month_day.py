@@ -0,0 +1,56 @@
+"""Birthday month-day
+
+Revision ID: a7c4e91f0b3d
+Revises: 8f3a2c6d1e47
+Create Date: 2026-10-18 14:05:51.902318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e91f0b3d'
+down_revision = '8f3a2c6d1e47'
+branch_labels = None
+depends_on = None
+
+# birthday_md is set by a trigger, not a stored generated column: adding one rewrites the whole table under lock
+SET_BIRTHDAY_MD_FUNCTION = """
+CREATE FUNCTION contacts_set_birthday_md() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.birthday_md := CAST(EXTRACT(MONTH FROM NEW.birthday) * 100 + EXTRACT(DAY FROM NEW.birthday) AS SMALLINT);
+    RETURN NEW;
+END
+$$
+"""
+
+# the backfill: short transactions by ranges of id, not one UPDATE that locks all the rows until the end
+BACKFILL_BATCH = 10000
+BACKFILL = ('UPDATE contacts SET birthday_md = CAST(EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) '
+            'AS SMALLINT) WHERE id > :first AND id <= :first + :batch AND birthday_md IS NULL')
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    op.execute(SET_BIRTHDAY_MD_FUNCTION)
+    # the new and changed rows get it from now on, the backfill does the others
+    op.execute('CREATE TRIGGER contacts_birthday_md BEFORE INSERT OR UPDATE OF birthday ON contacts '
+               'FOR EACH ROW EXECUTE PROCEDURE contacts_set_birthday_md()')
+
+    with op.get_context().autocommit_block():  # CONCURRENTLY: the table stays writable while the index is built
+        connection = op.get_bind()
+        last = connection.scalar(sa.text('SELECT max(id) FROM contacts')) or 0
+        for first in range(0, last, BACKFILL_BATCH):
+            connection.execute(sa.text(BACKFILL), {'first': first, 'batch': BACKFILL_BATCH})
+        op.create_index('ix_contacts_birthday_md', 'contacts', ['birthday_md'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_contacts_birthday_md')
+
+    op.execute('DROP TRIGGER IF EXISTS contacts_birthday_md ON contacts')
+    op.execute('DROP FUNCTION IF EXISTS contacts_set_birthday_md()')
+    op.drop_column('contacts', 'birthday_md')
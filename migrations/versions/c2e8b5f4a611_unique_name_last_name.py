@@ -0,0 +1,33 @@
+"""Unique name and last name
+
+Revision ID: c2e8b5f4a611
+Revises: a7c4e91f0b3d
+Create Date: 2026-10-18 16:27:12.640935
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8b5f4a611'
+down_revision = 'a7c4e91f0b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():  # CONCURRENTLY: the table stays writable while the index is built
+        try:
+            # fails if the table already has two records with the same name and last name - merge them first
+            op.create_index('uq_contacts_name_last_name', 'contacts', ['name', 'last_name'], unique=True,
+                            postgresql_concurrently=True)
+        except sa.exc.DBAPIError:
+            # a failed concurrent build leaves an INVALID index behind: drop it, so the migration can be run again
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS uq_contacts_name_last_name')
+            raise
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_contacts_name_last_name', table_name='contacts', postgresql_concurrently=True)
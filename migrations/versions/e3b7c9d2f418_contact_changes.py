@@ -0,0 +1,60 @@
+"""Contact changes (outbox)
+
+Revision ID: e3b7c9d2f418
+Revises: d9f1a0b7c352
+Create Date: 2026-10-18 21:12:45.331907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7c9d2f418'
+down_revision = 'd9f1a0b7c352'
+branch_labels = None
+depends_on = None
+
+# one row per changed contact, in the transaction of the change (any statement: single, batch, bulk, psql):
+# the snapshot has the fields of ContactResponse, a deleted contact has none
+LOG_CHANGE_FUNCTION = """
+CREATE FUNCTION contacts_log_change() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO contact_changes (contact_id, op, version) VALUES (OLD.id, 'delete', OLD.version);
+        RETURN OLD;
+    END IF;
+
+    INSERT INTO contact_changes (contact_id, op, version, data)
+    VALUES (NEW.id, CASE TG_OP WHEN 'INSERT' THEN 'create' ELSE 'update' END, NEW.version,
+            jsonb_build_object('id', NEW.id, 'name', NEW.name, 'last_name', NEW.last_name, 'email', NEW.email,
+                               'phone', NEW.phone, 'birthday', NEW.birthday, 'description', NEW.description));
+    RETURN NEW;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.create_table('contact_changes',
+                    sa.Column('seq', sa.BigInteger(), nullable=False),
+                    sa.Column('txid', sa.BigInteger(), server_default=sa.text('txid_current()'), nullable=False),
+                    sa.Column('contact_id', sa.Integer(), nullable=False),
+                    sa.Column('op', sa.String(length=6), nullable=False),
+                    sa.Column('version', sa.Integer(), nullable=False),
+                    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+                    sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+                    sa.PrimaryKeyConstraint('seq')
+                    )
+    op.create_index('ix_contact_changes_txid_seq', 'contact_changes', ['txid', 'seq'], unique=False)
+    op.execute(LOG_CHANGE_FUNCTION)
+    op.execute('CREATE TRIGGER contacts_log_change AFTER INSERT OR UPDATE OR DELETE ON contacts '
+               'FOR EACH ROW EXECUTE PROCEDURE contacts_log_change()')
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS contacts_log_change ON contacts')
+    op.execute('DROP FUNCTION IF EXISTS contacts_log_change()')
+    op.drop_index('ix_contact_changes_txid_seq', table_name='contact_changes')
+    op.drop_table('contact_changes')
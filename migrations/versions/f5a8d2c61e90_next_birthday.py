@@ -0,0 +1,109 @@
+"""Next birthday
+
+Revision ID: f5a8d2c61e90
+Revises: e3b7c9d2f418
+Create Date: 2026-10-18 23:05:12.640183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a8d2c61e90'
+down_revision = 'e3b7c9d2f418'
+branch_labels = None
+depends_on = None
+
+# the first birthday on or after today (the 29th of February is the 28th in the other years)
+NEXT_BIRTHDAY_FUNCTION = """
+CREATE FUNCTION contacts_next_birthday(birthday date, today date) RETURNS date LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN this_year >= today THEN this_year ELSE (birthday + make_interval(years => years + 1))::date END
+    FROM (SELECT (birthday + make_interval(years => years))::date AS this_year, years
+          FROM (SELECT (EXTRACT(YEAR FROM today) - EXTRACT(YEAR FROM birthday))::int AS years) AS y) AS t
+$$
+"""
+
+# a new or changed birthday: the next one at once (the ones that passed are rolled forward by the application)
+SET_NEXT_BIRTHDAY_FUNCTION = """
+CREATE FUNCTION contacts_set_next_birthday() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.next_birthday := contacts_next_birthday(NEW.birthday, current_date);
+    RETURN NEW;
+END
+$$
+"""
+
+# the change feed gets the changes of the record, not the roll forward of next_birthday
+LOG_CHANGE_TRIGGER = ('CREATE TRIGGER contacts_log_change AFTER INSERT OR DELETE OR UPDATE {columns}ON contacts '
+                      'FOR EACH ROW EXECUTE PROCEDURE contacts_log_change()')
+LOGGED_COLUMNS = 'name, last_name, email, phone, birthday, description, version'
+
+# the backfill: short transactions by ranges of id, not one UPDATE that locks all the rows until the end
+BACKFILL_BATCH = 10000
+BACKFILL = ('UPDATE contacts SET next_birthday = contacts_next_birthday(birthday, current_date) '
+            'WHERE id > :first AND id <= :first + :batch AND next_birthday IS NULL')
+
+# the downgrade brings birthday_md back the way a7c4e91f0b3d added it
+SET_BIRTHDAY_MD_FUNCTION = """
+CREATE FUNCTION contacts_set_birthday_md() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.birthday_md := CAST(EXTRACT(MONTH FROM NEW.birthday) * 100 + EXTRACT(DAY FROM NEW.birthday) AS SMALLINT);
+    RETURN NEW;
+END
+$$
+"""
+BIRTHDAY_MD_BACKFILL = ('UPDATE contacts SET birthday_md = CAST(EXTRACT(MONTH FROM birthday) * 100 '
+                        '+ EXTRACT(DAY FROM birthday) AS SMALLINT) '
+                        'WHERE id > :first AND id <= :first + :batch AND birthday_md IS NULL')
+
+
+def upgrade() -> None:
+    op.execute('DROP TRIGGER contacts_log_change ON contacts')
+    op.execute(LOG_CHANGE_TRIGGER.format(columns=f'OF {LOGGED_COLUMNS} '))
+
+    op.execute(NEXT_BIRTHDAY_FUNCTION)
+    op.add_column('contacts', sa.Column('next_birthday', sa.Date(), nullable=True))  # no default: no table rewrite
+    op.execute(SET_NEXT_BIRTHDAY_FUNCTION)
+    # the new and changed rows get it from now on, the backfill does the others
+    op.execute('CREATE TRIGGER contacts_next_birthday BEFORE INSERT OR UPDATE OF birthday ON contacts '
+               'FOR EACH ROW EXECUTE PROCEDURE contacts_set_next_birthday()')
+
+    with op.get_context().autocommit_block():  # CONCURRENTLY: without the lock that stops the writes
+        connection = op.get_bind()
+        last = connection.scalar(sa.text('SELECT max(id) FROM contacts')) or 0
+        for first in range(0, last, BACKFILL_BATCH):
+            connection.execute(sa.text(BACKFILL), {'first': first, 'batch': BACKFILL_BATCH})
+        op.create_index('ix_contacts_next_birthday_id', 'contacts', ['next_birthday', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        # next_birthday replaces it: one range instead of two at the year end, and no sort by the year wrap
+        op.drop_index('ix_contacts_birthday_md', table_name='contacts', postgresql_concurrently=True)
+
+    op.execute('DROP TRIGGER IF EXISTS contacts_birthday_md ON contacts')
+    op.execute('DROP FUNCTION IF EXISTS contacts_set_birthday_md()')
+    op.drop_column('contacts', 'birthday_md')
+
+
+def downgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    op.execute(SET_BIRTHDAY_MD_FUNCTION)
+    op.execute('CREATE TRIGGER contacts_birthday_md BEFORE INSERT OR UPDATE OF birthday ON contacts '
+               'FOR EACH ROW EXECUTE PROCEDURE contacts_set_birthday_md()')
+
+    op.execute('DROP TRIGGER IF EXISTS contacts_next_birthday ON contacts')
+    op.execute('DROP FUNCTION IF EXISTS contacts_set_next_birthday()')
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last = connection.scalar(sa.text('SELECT max(id) FROM contacts')) or 0
+        for first in range(0, last, BACKFILL_BATCH):
+            connection.execute(sa.text(BIRTHDAY_MD_BACKFILL), {'first': first, 'batch': BACKFILL_BATCH})
+        op.create_index('ix_contacts_birthday_md', 'contacts', ['birthday_md'], unique=False,
+                        postgresql_concurrently=True)
+        op.drop_index('ix_contacts_next_birthday_id', table_name='contacts', postgresql_concurrently=True)
+
+    op.drop_column('contacts', 'next_birthday')
+    op.execute('DROP FUNCTION IF EXISTS contacts_next_birthday(date, date)')
+
+    op.execute('DROP TRIGGER contacts_log_change ON contacts')
+    op.execute(LOG_CHANGE_TRIGGER.format(columns=''))
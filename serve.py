@@ -0,0 +1,71 @@
+# production: N процесів-воркерів uvicorn (за замовчуванням - за кількістю ядер), python serve.py [--workers N]
+import argparse
+import logging
+import os
+import sys
+import threading
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src.settings import config
+
+
+STARTUP_FAILURE = 3  # the exit code of uvicorn when the application did not start
+
+
+class GracefulServer(uvicorn.Server):
+    """On SIGTERM / SIGINT the server stops accepting and waits for the requests in flight (then the lifespan
+    shutdown closes the pools). If they are not done in graceful_timeout seconds - it exits without waiting more."""
+
+    def __init__(self, config: uvicorn.Config, graceful_timeout: float) -> None:
+        super().__init__(config)
+        self.graceful_timeout = graceful_timeout  # an attribute of the instance: it is passed to the spawned workers
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if not self.should_exit and self.graceful_timeout > 0:
+            timer = threading.Timer(self.graceful_timeout, setattr, (self, 'force_exit', True))
+            timer.daemon = True
+            timer.start()
+        super().handle_exit(sig, frame)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run the application with N worker processes ([SERVER] in config.ini).')
+    parser.add_argument('--host', default=config.get('SERVER', 'host', fallback='0.0.0.0'))
+    parser.add_argument('--port', type=int, default=config.getint('SERVER', 'port', fallback=8000))
+    parser.add_argument('--workers', type=int, default=config.getint('SERVER', 'workers', fallback=0),
+                        help='worker processes (0: one per CPU core)')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    os.environ['CONTACTS__SERVER__WORKERS'] = str(workers)  # for the workers (e.g. a local-only cache needs one)
+
+    # the workers import main:app themselves (spawned, not forked): each one makes its own engines in the lifespan,
+    # this process only watches them - it has no pool and never reads the password
+    server_config = uvicorn.Config('main:app',
+                                   host=args.host,
+                                   port=args.port,
+                                   workers=workers,
+                                   loop='auto',  # uvloop if it is installed (uvicorn[standard])
+                                   http='auto',  # httptools if it is installed
+                                   lifespan='on',
+                                   backlog=config.getint('SERVER', 'backlog', fallback=2048),
+                                   timeout_keep_alive=config.getint('SERVER', 'keep_alive', fallback=5),
+                                   access_log=config.getboolean('SERVER', 'access_log', fallback=False))
+    server = GracefulServer(server_config, config.getfloat('SERVER', 'graceful_timeout', fallback=30))
+
+    pool_connections = config.getint('DB_POOL', 'size', fallback=10) + config.getint('DB_POOL', 'max_overflow', fallback=10)
+    logging.getLogger('uvicorn.error').info(f'{workers} workers: up to {workers * pool_connections} connections '
+                                            f'to the database (max_connections of the server must allow them)')
+    if workers > 1:
+        Multiprocess(server_config, target=server.run, sockets=[server_config.bind_socket()]).run()
+    else:
+        server.run()
+        if not server.started:
+            sys.exit(STARTUP_FAILURE)
+
+
+if __name__ == '__main__':
+    main()
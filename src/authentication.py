@@ -1,11 +1,10 @@
 import logging
+import os
 import pathlib
 
 
 key_file = 'key.txt'
 
-logging.basicConfig(level=logging.DEBUG, format='%(message)s')
-
 
 def watcher(function):
     def inner_eye(*args, **kwargs):
@@ -34,13 +33,23 @@ def load_key(key_file: str) -> str:
 
 
 def get_password(key_file: str = key_file) -> str:
-    """Return password from local file or user input in CLI."""
+    """Return password from the environment (DB_PASSWORD), a secrets file (DB_PASSWORD_FILE, e.g. a docker secret)
+    or the local key file. Never asks: without any of them - RuntimeError (python -m src.authentication saves the key file)."""
+    if 'DB_PASSWORD' in os.environ:
+        return os.environ['DB_PASSWORD']
+
+    secrets_file = os.environ.get('DB_PASSWORD_FILE')
+    if secrets_file:
+        return pathlib.Path(secrets_file).read_text().strip()
+
     if pathlib.Path(key_file).exists():
         logging.info(f'Ok! Key-file found.')
-        key = load_key(key_file)
+        return load_key(key_file)
 
-    else:
-        key: str = input('Enter the KEY:\n')
-        save_key(key_file, key) if key else None
-    
-    return key
+    raise RuntimeError(f'No database password: set DB_PASSWORD or DB_PASSWORD_FILE, or create {key_file} '
+                       f'(python -m src.authentication)')
+
+
+if __name__ == '__main__':
+    key: str = input('Enter the KEY:\n')
+    save_key(key_file, key) if key else None
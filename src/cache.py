@@ -0,0 +1,344 @@
+# кеш контактів: LRU + TTL у процесі та (за бажанням) спільний бекенд (Redis) для всіх воркерів
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from src.database.models import Contact
+from src.schemes import ContactResponse
+from src.settings import config
+
+try:
+    import redis.asyncio as redis  # poetry install -E cache
+except ImportError:
+    redis = None
+
+
+class LRUCache:
+    """In-process cache: the least recently used key is evicted when max_size is reached,
+    a key expires ttl seconds after it was set."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._data: OrderedDict = OrderedDict()  # key: (expires at, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        if item[0] < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return None
+
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class LocalSharedBackend:
+    """Stand-in for the shared backend (same calls as RedisBackend) kept in this process: for tests and dev."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            return None
+
+        return item[1]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def set_many(self, values: Dict[str, str], ttl: float) -> None:
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    async def set_unless_older(self, key: str, value: str, ttl: float, version_key: str, version: int) -> bool:
+        """Set the key, unless version_key holds a version above the given one (no await between: atomic here)."""
+        floor = await self.get(version_key)
+        if floor is not None and int(floor) > version:
+            return False
+
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+
+# KEYS: the key, the version key; ARGV: the value, the version, the TTL in milliseconds
+SET_UNLESS_OLDER = """
+local floor = redis.call('GET', KEYS[2])
+if floor and tonumber(floor) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+return 1
+"""
+
+
+class RedisBackend:
+    """Shared backend: one cache for all the workers (and instances) of the application."""
+
+    def __init__(self, url: str) -> None:
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._set_unless_older = self._redis.register_script(SET_UNLESS_OLDER)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return await self._redis.mget(keys)  # one round trip
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def set_many(self, values: Dict[str, str], ttl: float) -> None:
+        async with self._redis.pipeline(transaction=False) as pipeline:  # one round trip
+            for key, value in values.items():
+                pipeline.set(key, value, px=int(ttl * 1000))
+            await pipeline.execute()
+
+    async def set_unless_older(self, key: str, value: str, ttl: float, version_key: str, version: int) -> bool:
+        """Set the key, unless version_key holds a version above the given one (one script: atomic in Redis)."""
+        return bool(await self._set_unless_older(keys=[key, version_key], args=[value, version, int(ttl * 1000)]))
+
+    async def delete(self, *keys: str) -> None:
+        await self._redis.delete(*keys)
+
+
+class ContactCache:
+    """Read-through cache of contacts: the contact is stored under its id,
+    a lookup field (name, last_name, email, phone) keeps only a pointer to the id.
+
+    So a change of the contact invalidates just one key (its id): a pointer left to the old value
+    is checked against the contact it points to and is a miss when they don't match.
+
+    A read takes the generation before its query and puts the contact with it: if a write has invalidated
+    anything in the meantime, the row it read may be the old one, so it is not cached. The generation
+    is of this worker only: for the writes of the other workers an invalidation leaves the version
+    of the written row in the shared backend (for the TTL), and a put of an older version is rejected there."""
+
+    def __init__(self,
+                 local: LRUCache,
+                 shared: Union[LocalSharedBackend, RedisBackend, None] = None,
+                 shared_ttl: float = 0) -> None:
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl or local.ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # + 1 by every invalidation
+        self.skipped_puts = 0
+
+    @staticmethod
+    def _id_key(contact_id: int) -> str:
+        return f'contact:id:{contact_id}'
+
+    @staticmethod
+    def _field_key(field: str, value: Any) -> str:
+        return f'contact:{field}:{value}'
+
+    @staticmethod
+    def _version_key(contact_id: int) -> str:
+        return f'contact:version:{contact_id}'  # the lowest version that may be cached
+
+    async def _get(self, key: str, decode: Callable[[str], Any]) -> Any:
+        """Local first, then the shared backend (kept locally on a hit)."""
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            raw = await self.shared.get(key)
+            if raw is not None:
+                value = decode(raw)
+                self.local.set(key, value)
+
+        return value
+
+    async def _set(self, key: str, value: Any, raw: str) -> None:
+        self.local.set(key, value)  # objects, so a local hit costs no parsing (and no validation)
+        if self.shared is not None:
+            await self.shared.set(key, raw, self.shared_ttl)
+
+    @staticmethod
+    def _dumps(contact: ContactResponse) -> str:
+        """JSON of the contact with its version (excluded from .json() - it is not a part of the response)."""
+        return json.dumps({**contact.dict(), 'version': contact.version, 'updated_at': contact.updated_at},
+                          default=str)
+
+    async def get(self, contact_id: int) -> Optional[ContactResponse]:
+        contact = await self._get(self._id_key(contact_id), ContactResponse.parse_raw)
+        if contact is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return contact
+
+    async def get_many(self, contact_ids: List[int]) -> Dict[int, ContactResponse]:
+        """The cached ones of the contacts: local first, then the rest from the shared backend at once."""
+        found = {}
+        for contact_id in contact_ids:
+            contact = self.local.get(self._id_key(contact_id))
+            if contact is not None:
+                found[contact_id] = contact
+
+        missing = [contact_id for contact_id in contact_ids if contact_id not in found]
+        if missing and self.shared is not None:
+            keys = [self._id_key(contact_id) for contact_id in missing]
+            for key, contact_id, raw in zip(keys, missing, await self.shared.get_many(keys)):
+                if raw is not None:
+                    found[contact_id] = ContactResponse.parse_raw(raw)
+                    self.local.set(key, found[contact_id])
+
+        self.hits += len(found)
+        self.misses += len(contact_ids) - len(found)
+        return found
+
+    async def get_by(self, field: str, value: Any) -> Optional[ContactResponse]:
+        contact_id = await self._get(self._field_key(field, value), int)
+        contact = await self._get(self._id_key(contact_id), ContactResponse.parse_raw) if contact_id else None
+        if contact is None or getattr(contact, field) != value:  # no pointer, no contact or a stale pointer
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return contact
+
+    async def put(self,
+                  contact: Union[Contact, ContactResponse],
+                  *lookup: str,
+                  generation: Optional[int] = None) -> None:
+        """Cache the contact under its id and the pointers of the lookup fields it was found by,
+        unless there was an invalidation after the generation taken before it was read
+        (or, in the shared backend, a newer version was written)."""
+        if generation is not None and generation != self.generation:
+            self.skipped_puts += 1
+            return
+
+        contact = contact if isinstance(contact, ContactResponse) else ContactResponse.from_orm(contact)
+        key = self._id_key(contact.id)
+        if self.shared is not None and not await self.shared.set_unless_older(
+                key, self._dumps(contact), self.shared_ttl, self._version_key(contact.id), contact.version):
+            self.skipped_puts += 1  # another worker has written a newer version meanwhile
+            return
+
+        self.local.set(key, contact)
+        for field in lookup:
+            await self._set(self._field_key(field, getattr(contact, field)), contact.id, str(contact.id))
+
+    async def invalidate(self, *contacts: Union[Contact, ContactResponse], deleted: bool = False) -> None:
+        """Drop the written contacts. The shared backend keeps their new versions (for a deleted one, a version
+        above its last), set before the delete: a read of an older row in flight in another worker is not cached."""
+        self.generation += 1
+        keys = [self._id_key(contact.id) for contact in contacts]
+        self.local.delete(*keys)
+        if self.shared is not None and keys:
+            versions = {self._version_key(contact.id): str(contact.version + 1 if deleted else contact.version)
+                        for contact in contacts}
+            await self.shared.set_many(versions, self.shared_ttl)
+            await self.shared.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.local.evictions,
+            'expirations': self.local.expirations,
+            'size': len(self.local),
+            'max_size': self.local.max_size,
+            'shared': type(self.shared).__name__ if self.shared is not None else None,
+            'skipped_puts': self.skipped_puts,
+        }
+
+
+def _workers() -> int:
+    """[SERVER] WORKERS, 0 - one per core (serve.py passes the real number)."""
+    return config.getint('SERVER', 'workers', fallback=1) or os.cpu_count() or 1
+
+
+def _redis_configured() -> bool:
+    shared_url = config.get('CACHE', 'shared_url', fallback='')
+    return bool(shared_url) and shared_url != 'local' and redis is not None
+
+
+def create_contact_cache() -> Optional[ContactCache]:
+    """The cache from the [CACHE] section of config.ini, None if it is disabled.
+    With a shared backend the local copies should live shortly (LOCAL_TTL): an invalidation reaches 
+    the shared backend and the local cache of this worker only.
+
+    Without a shared backend (or with the in-process stand-in) an invalidation reaches this worker only:
+    the other workers would return the old contact (and 304 for its old ETag) for TTL seconds. So with more
+    than one worker ([SERVER] WORKERS, 0 - one per core; serve.py passes the real number) it is not created."""
+    if not config.getboolean('CACHE', 'enabled', fallback=False):
+        return None
+
+    shared_url = config.get('CACHE', 'shared_url', fallback='')
+    shared = None
+    if shared_url == 'local':
+        shared = LocalSharedBackend()
+    elif shared_url:
+        if redis is None:
+            logging.error('Shared cache is not available: redis is not installed (poetry install -E cache)')
+        else:
+            shared = RedisBackend(shared_url)
+
+    workers = _workers()
+    if not isinstance(shared, RedisBackend) and workers > 1:
+        logging.error(f'Contact cache is disabled: {workers} workers need a shared backend ([CACHE] SHARED_URL)')
+        return None
+
+    ttl = config.getfloat('CACHE', 'ttl', fallback=30)
+    local = LRUCache(max_size=config.getint('CACHE', 'max_size', fallback=10000),
+                     ttl=config.getfloat('CACHE', 'local_ttl', fallback=ttl))
+
+    return ContactCache(local, shared, ttl)
+
+
+def create_page_cache() -> Optional[LRUCache]:
+    """Serialized page bodies (by the URL of the request), None if PAGES is off. A write clears the cache 
+    of this worker only, so PAGE_TTL (seconds) is how long the other workers may return an old page.
+    Like the contact cache, with more than one worker it is created only along with Redis ([CACHE] SHARED_URL):
+    a deployment that shares the contacts between the workers accepts pages as old as PAGE_TTL."""
+    if not config.getboolean('CACHE', 'pages', fallback=False):
+        return None
+
+    workers = _workers()
+    if workers > 1 and not _redis_configured():
+        logging.error(f'Page cache is disabled: {workers} workers need a shared backend ([CACHE] SHARED_URL)')
+        return None
+
+    return LRUCache(max_size=config.getint('CACHE', 'page_max_size', fallback=1000),
+                    ttl=config.getfloat('CACHE', 'page_ttl', fallback=2))
+
+
+contact_cache = create_contact_cache()
+page_cache = create_page_cache()
@@ -0,0 +1,140 @@
+# умовні запити: ETag / Last-Modified -> 304 без серіалізації, та готові тіла сторінок з кешу
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi_pagination import Page
+from pydantic import BaseModel
+
+from src.cache import page_cache
+from src.database.db_connect import read_your_writes
+from src.database.models import Contact
+from src.repository.rows import RowPage
+from src.schemes import ContactResponse
+
+
+def contact_etag(contact: Union[Contact, ContactResponse]) -> str:
+    """The version is increased by every update, so (id, version) identifies the body of the contact."""
+    return f'"{contact.id}.{contact.version}"'
+
+
+def page_etag(page: Union[Page, RowPage]) -> str:
+    """A hash of what the page is made of: the paging and the (id, version) of every item.
+    A changed, added or deleted record changes the items or the total."""
+    digest = hashlib.sha1(f'{page.total}:{page.page}:{page.size}'.encode())
+    for item in page.items:
+        digest.update(f':{item.id}.{item.version}'.encode())
+
+    return f'"{digest.hexdigest()}"'
+
+
+def _render(model: BaseModel) -> bytes:
+    """JSON of the model - the same bytes as the JSONResponse of FastAPI for the response_model."""
+    return model.json(ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _utc(moment: datetime) -> datetime:
+    """HTTP dates are GMT: psycopg2 returns timestamptz in the TimeZone of the session, a date without a zone is UTC."""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def _headers(etag: str, modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}  # may be stored, but is revalidated each time
+    if modified is not None:
+        headers['Last-Modified'] = format_datetime(_utc(modified), usegmt=True)
+
+    return headers
+
+
+def _not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """If-None-Match (weak comparison, "*"), or without it - If-Modified-Since (to the second)."""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None or modified is None:
+        return False
+
+    try:
+        return _utc(modified).replace(microsecond=0) <= _utc(parsedate_to_datetime(if_modified_since))
+
+    except (TypeError, ValueError):  # not a date: the header is ignored
+        return False
+
+
+def precondition_failed() -> HTTPException:
+    """412: the record was changed since the client read the version it sends in If-Match."""
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
+                         detail='Contact was changed (If-Match does not match its version)')
+
+
+def if_match_versions(request: Request, contact_id: int) -> Optional[List[int]]:
+    """The versions of the contact listed in If-Match (strong comparison: weak tags never match),
+    or None without a precondition (no header, or "*"). No tag of this contact - 412 at once."""
+    if_match = request.headers.get('if-match')
+    if if_match is None:
+        return None
+
+    versions = []
+    for tag in (tag.strip() for tag in if_match.split(',')):
+        if tag == '*':
+            return None
+        tag_id, _, version = tag.strip('"').partition('.') if tag.startswith('"') else ('', '', '')
+        if tag_id == str(contact_id) and version.isdigit():
+            versions.append(int(version))
+
+    if not versions:
+        raise precondition_failed()
+    return versions
+
+
+def contact_response(request: Request, contact: Union[Contact, ContactResponse, None]) -> Response:
+    """The contact (404 if it is None) with ETag and Last-Modified, or 304 if the client has this version."""
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
+
+    etag = contact_etag(contact)
+    headers = _headers(etag, contact.updated_at)
+    if _not_modified(request, etag, contact.updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(_render(ContactResponse.from_orm(contact)), media_type='application/json', headers=headers)
+
+
+async def page_response(request: Request, load: Callable[[], Awaitable[Union[Page, RowPage, None]]]) -> Response:
+    """The page from load() (404 if it is None) with ETag, or 304 if the client has the same page.
+
+    The page is serialized only for a 200, and the body is kept in the page cache (by the URL of the request),
+    so a repeated poll within PAGE_TTL costs neither the queries nor the serialization.
+    A cached page may come from a replica, so X-Read-Your-Writes loads the page anew (from the primary).
+    Pages have no Last-Modified: a deleted record changes the page, but not the newest updated_at on it."""
+    key = str(request.url)
+    entry = page_cache.get(key) if page_cache is not None and not read_your_writes(request) else None
+    if entry is not None:
+        etag, body = entry
+    else:
+        page = await load()
+        if page is None:  # NoConnection in database...
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
+
+        etag, body = page_etag(page), None
+
+    if _not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_headers(etag))
+
+    if body is None:
+        body = page.render() if isinstance(page, RowPage) else _render(page)
+        if page_cache is not None:
+            page_cache.set(key, (etag, body))
+
+    return Response(body, media_type='application/json', headers=_headers(etag))
+
+
+def clear_page_cache() -> None:
+    """Any write may change any page (its items, order or total)."""
+    if page_cache is not None:
+        page_cache.clear()
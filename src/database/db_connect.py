@@ -1,41 +1,66 @@
-# підключення до бази даних (sqlite/PostgreSQL)
-import configparser  # for work with *.ini (config.ini)
+# підключення до бази даних (sqlite/PostgreSQL): рушії та сесії створюються при першому використанні, не при імпорті
 import logging
-import pathlib
-from typing import Optional
+from functools import cached_property
+from typing import Any, Optional
 
+from fastapi import Request
 from sqlalchemy import (
     create_engine, 
     Engine,
+    text,
     )
+from sqlalchemy.ext.asyncio import (
+    async_sessionmaker,
+    create_async_engine,
+    AsyncEngine,
+    )
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from src.authentication import get_password
-
-
-CONFIG_FILE = 'config.ini'
-
-logging.basicConfig(level=logging.DEBUG, format='%(threadName)s %(message)s')
-
-file_config = pathlib.Path(__file__).parent.parent.joinpath(CONFIG_FILE)  # try?
-config = configparser.ConfigParser()
-config.read(file_config)
-
-user = config.get('DB_DEV', 'user')
-# password = config.get('DB_DEV', 'password')
-password = get_password()
-database = config.get('DB_DEV', 'db_name')
-host = config.get('DB_DEV', 'host')
-# port = config.get('DB_DEV', 'port')
-
-SQLALCHEMY_DATABASE_URL = url_to_db = f'postgresql+psycopg2://{user}:{password}@{host}/{database}'  # if or try?
+from src.database.monitoring import (
+    query_observers,
+    slow_query_logger,
+    time_queries,
+    TimedAsyncQueuePool,
+    TimedQueuePool,
+    )
+from src.database.offload import BoundedExecutor, OffloadSession
+from src.database.replicas import Replica, ReplicaReadSession, ReplicaSet
+from src.settings import config
+
+
+pool_size = config.getint('DB_POOL', 'size', fallback=10)
+pool_options = {
+    'pool_size': pool_size,
+    'max_overflow': config.getint('DB_POOL', 'max_overflow', fallback=10),
+    'pool_timeout': config.getfloat('DB_POOL', 'timeout', fallback=30),
+    'pool_recycle': config.getint('DB_POOL', 'recycle', fallback=-1),  # seconds, -1: never
+    'pool_pre_ping': config.getboolean('DB_POOL', 'pre_ping', fallback=False),
+    'echo': config.getboolean('DB_POOL', 'echo', fallback=False),  # every statement to the log: debug only
+}
+slow_query_ms = config.getfloat('SLOW_QUERY', 'threshold_ms', fallback=0)  # 0: off
+slow_query_sample_rate = config.getfloat('SLOW_QUERY', 'sample_rate', fallback=1.0)
+if slow_query_ms:
+    query_observers.append(slow_query_logger(slow_query_ms, slow_query_sample_rate))
+
+
+def database_url(driver: str = 'psycopg2', host: Optional[str] = None) -> str:
+    """The URL of the database ([DB_DEV], the password from get_password), or of a replica on another host."""
+    user = config.get('DB_DEV', 'user')
+    # password = config.get('DB_DEV', 'password')
+    password = get_password()
+    db_name = config.get('DB_DEV', 'db_name')
+    # port = config.get('DB_DEV', 'port')
+    return f'postgresql+{driver}://{user}:{password}@{host or config.get("DB_DEV", "host")}/{db_name}'
 
 
 def create_connection(*args, **kwargs) -> tuple[Optional[Engine], Optional[sessionmaker]]:
     """Create a database connection (session) to a PostgreSQL database (engine)."""
     try:
-        engine_ = create_engine(url_to_db, echo=True, pool_size=10)
+        engine_ = create_engine(database_url(), poolclass=TimedQueuePool, **pool_options)
+        time_queries(engine_)
         db_session = sessionmaker(autocommit=False, autoflush=False, bind=engine_)
     
     except Exception as error:
@@ -45,7 +70,103 @@ def create_connection(*args, **kwargs) -> tuple[Optional[Engine], Optional[sessi
     return engine_, db_session
 
 
-engine, SessionLocal = create_connection()
+def create_async_connection(*args, **kwargs) -> tuple[Optional[AsyncEngine], Optional[async_sessionmaker]]:
+    """Create an asynchronous database connection (session) to a PostgreSQL database (engine)."""
+    try:
+        async_engine_ = create_async_engine(database_url('asyncpg'), poolclass=TimedAsyncQueuePool, **pool_options)
+        time_queries(async_engine_.sync_engine)
+        # expire_on_commit=False: the routes serialize the objects after commit, 
+        # and lazy refresh (implicit IO) is not allowed for an AsyncSession
+        async_db_session = async_sessionmaker(bind=async_engine_, autoflush=False, expire_on_commit=False)
+    
+    except Exception as error:
+        logging.error(f'Wrong async connect. error:\n{error}')
+        return None, None
+
+    return async_engine_, async_db_session
+
+
+def create_replicas() -> ReplicaSet:
+    """[DB_REPLICAS] HOSTS=host[:port], ... - the same user, password and database as the primary."""
+    hosts = [host.strip() for host in config.get('DB_REPLICAS', 'hosts', fallback='').split(',') if host.strip()]
+    connect_timeout = config.getint('DB_REPLICAS', 'connect_timeout', fallback=2)
+    return ReplicaSet([Replica(host, database_url(host=host), database_url('asyncpg', host), pool_options, connect_timeout)
+                       for host in hosts],
+                      retry_after=config.getfloat('DB_REPLICAS', 'retry_after', fallback=30))
+
+
+def has_trigram(engine: Engine, default: bool = False) -> bool:
+    """Is pg_trgm installed in the database of the engine (the search ranks by its similarity then)?
+    The default if the database does not answer now."""
+    try:
+        with engine.connect() as connection:
+            return bool(connection.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")))
+
+    except (DBAPIError, OSError) as error:
+        logging.warning(f'pg_trgm could not be checked ({engine.url.render_as_string(hide_password=True)}), '
+                        f'taken as {default}: {error}')
+        return default
+
+
+class Database:
+    """The engines and the session factories, created on the first use (the application creates them 
+    in its lifespan), so an import (alembic, workers, scripts) neither reads the password nor builds pools."""
+
+    @cached_property
+    def _sync(self) -> tuple[Optional[Engine], Optional[sessionmaker]]:
+        return create_connection()
+
+    @cached_property
+    def _async(self) -> tuple[Optional[AsyncEngine], Optional[async_sessionmaker]]:
+        return create_async_connection()
+
+    @property
+    def engine(self) -> Optional[Engine]:
+        return self._sync[0]
+
+    @property
+    def session(self) -> Optional[sessionmaker]:  # SessionLocal
+        return self._sync[1]
+
+    @property
+    def async_engine(self) -> Optional[AsyncEngine]:
+        return self._async[0]
+
+    @property
+    def async_session(self) -> Optional[async_sessionmaker]:  # AsyncSessionLocal
+        return self._async[1]
+
+    @cached_property
+    def replicas(self) -> ReplicaSet:
+        return create_replicas()
+
+    def connect(self) -> None:
+        """Create all of them now (at the start of the application, not in the first request):
+        without a password or with a wrong URL the application does not start. 
+        Each database is asked once here whether it has pg_trgm."""
+        if self.engine is None or self.async_engine is None:
+            raise RuntimeError('No database connection (see the error above)')
+
+        # the sessions know if their database has pg_trgm (db.info['trigram']): a replica may be another server
+        trigram = has_trigram(self.engine)
+        self.session.configure(info={'trigram': trigram})
+        self.async_session.configure(info={'trigram': trigram})
+        for replica in self.replicas.replicas:
+            replica_trigram = has_trigram(replica.engine, default=trigram)
+            replica.session.configure(info={'replica': True, 'trigram': replica_trigram})
+            replica.async_session.configure(info={'replica': True, 'trigram': replica_trigram})
+
+    async def dispose(self) -> None:
+        """Close the pooled connections of the ones that were created (at the shutdown of the application)."""
+        if '_async' in self.__dict__ and self.async_engine is not None:
+            await self.async_engine.dispose()
+        if '_sync' in self.__dict__ and self.engine is not None:
+            self.engine.dispose()
+        if 'replicas' in self.__dict__:
+            await self.replicas.dispose()
+
+
+database = Database()
 
 
 Base = declarative_base()
@@ -54,8 +175,71 @@ Base = declarative_base()
 # Dependency
 def get_db():
     """Returns a session using a factory: SessionLocal."""  
-    db = SessionLocal()
+    db = database.session()
     try:
         yield db
     finally:
         db.close()
+
+
+# Dependency (async)
+async def get_async_db():
+    """Returns an asynchronous session using a factory: AsyncSessionLocal."""
+    async with database.async_session() as db:
+        yield db
+
+
+# Offload mode (psycopg2 only): the sync session runs in a bounded thread pool, not on the event loop
+offload_enabled = config.getboolean('OFFLOAD', 'enabled', fallback=False)
+offload_executor = BoundedExecutor(workers=config.getint('OFFLOAD', 'workers', fallback=pool_size),
+                                   queue_depth=config.getint('OFFLOAD', 'queue_depth', fallback=pool_size * 2))
+
+
+# Dependency (sync session in the thread pool)
+async def get_offload_db():
+    """Returns a sync session (SessionLocal) wrapped to run every query in the offload thread pool."""
+    offload_executor.check_capacity()  # 503 at once, before a connection is taken
+    # no expiring on commit: a lazy refresh would run the query on the event loop
+    db = OffloadSession(database.session(expire_on_commit=False), offload_executor)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+get_db_session = get_offload_db if offload_enabled else get_async_db
+
+
+READ_YOUR_WRITES_HEADER = 'x-read-your-writes'  # any value but "no"/"0"/"false": the reads of the request go to the primary
+
+
+def read_your_writes(request: Request) -> bool:
+    return request.headers.get(READ_YOUR_WRITES_HEADER, 'no').lower() not in ('no', '0', 'false')
+
+
+def _open_read_session(replica: Optional[Replica]) -> Any:
+    """A session of the replica, or of the primary for None (no connection is taken yet)."""
+    session, async_session = ((replica.session, replica.async_session) if replica is not None
+                              else (database.session, database.async_session))
+    if offload_enabled:
+        offload_executor.check_capacity()
+        return OffloadSession(session(expire_on_commit=False), offload_executor)
+    return async_session()
+
+
+# Dependency (reads that may lag behind the primary a little: lists and searches)
+async def get_read_db_session(request: Request):
+    """Returns a session of the next healthy read replica (round-robin, a failed one is skipped),
+    or of the primary: without replicas, when none of them answers, or for X-Read-Your-Writes.
+    The replica is connected at the first query (see ReplicaReadSession)."""
+    replicas = database.replicas
+    if replicas and not read_your_writes(request):
+        db = ReplicaReadSession(replicas, _open_read_session)
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+
+    async for db in get_db_session():
+        yield db
@@ -0,0 +1,57 @@
+# готовність бази даних для readiness-перевірок: без окремого з'єднання з пулу на кожну перевірку
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from src.database.db_connect import get_db_session
+from src.database.monitoring import primary_query_observers
+from src.settings import config
+
+
+class DatabaseHealth:
+    """Any statement of the primary that succeeded within ttl seconds (the requests run them anyway) proves it is up.
+    Only without one (an idle worker) a SELECT 1 is run - one for all the probes that come at that moment,
+    and at most one per ttl, so the probes don't take a pool connection each."""
+
+    def __init__(self, ttl: float, timeout: float) -> None:
+        self.ttl = ttl
+        self.timeout = timeout
+        self.last_ok = 0.0  # time.monotonic() of the last successful statement
+        self.last_error: Optional[str] = None
+        self._check: Optional[asyncio.Task] = None
+
+    def observe(self, statement: str, elapsed: float) -> None:
+        self.last_ok = time.monotonic()
+
+    async def _select_one(self) -> bool:
+        try:
+            async with asynccontextmanager(get_db_session)() as db:
+                await asyncio.wait_for(db.execute(text('SELECT 1')), self.timeout)
+            self.last_error = None
+            return True
+
+        except Exception as error:  # no connection, timeout, saturated pool (503) ...
+            self.last_error = f'{type(error).__name__}: {error}'
+            logging.warning(f'Database is not ready: {self.last_error}')
+            return False
+
+    async def ready(self) -> bool:
+        if time.monotonic() - self.last_ok < self.ttl:
+            return True
+
+        if self._check is None or self._check.done():
+            self._check = asyncio.create_task(self._select_one())
+        return await asyncio.shield(self._check)  # a probe that gives up does not cancel the check of the others
+
+    def stats(self) -> Dict[str, Any]:
+        return {'last_ok_seconds_ago': round(time.monotonic() - self.last_ok, 3) if self.last_ok else None,
+                'last_error': self.last_error}
+
+
+database_health = DatabaseHealth(ttl=config.getfloat('HEALTH', 'ready_ttl', fallback=10),
+                                 timeout=config.getfloat('HEALTH', 'check_timeout', fallback=2))
+primary_query_observers.append(database_health.observe)  # a replica that answers says nothing of the primary
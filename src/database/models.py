@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Date, Integer, String
+from sqlalchemy import BigInteger, Column, Date, DateTime, FetchedValue, func, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import JSONB
 # from sqlalchemy.orm import relationship
 
 from src.database.db_connect import Base
@@ -7,9 +8,51 @@ from src.database.db_connect import Base
 class Contact(Base):
     __tablename__: str = "contacts"
     id = Column(Integer, primary_key=True)
-    name = Column(String(30), index=True)
+    name = Column(String(30), index=True, nullable=False)  # keyset pages: (name, id) > (:name, :id)
     last_name = Column(String(40), index=True)
     email = Column(String(30), unique=True, index=True)
     phone = Column(Integer, unique=True, index=True)
     birthday = Column(Date, index=True, nullable=True)
+    # the next birthday (today or later): "birthdays within days" is one range of the index (next_birthday, id).
+    # Set by the trigger contacts_next_birthday when the birthday is set, rolled forward by repository.birthdays
+    next_birthday = Column(Date, nullable=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
     description = Column(String(3000))
+    # the phone as text for LIKE '%x%', set by the trigger contacts_phone_text (migration 8f3a2c6d1e47)
+    phone_text = Column(String(10), server_default=FetchedValue(), server_onupdate=FetchedValue())
+    # ETag / Last-Modified: the version is increased by every update of the record
+    version = Column(Integer, nullable=False, server_default='1')
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    # server-side values (updated_at, columns set by triggers) come back by RETURNING, no lazy load after a flush
+    __mapper_args__ = {'eager_defaults': True}
+
+    __table_args__ = (
+        Index('ix_contacts_name_id', 'name', 'id'),  # keyset pagination: ORDER BY name, id
+        Index('ix_contacts_next_birthday_id', 'next_birthday', 'id'),  # birthdays: ORDER BY next_birthday, id
+        Index('uq_contacts_name_last_name', 'name', 'last_name', unique=True),  # duplicates (409) by the DB
+        # substring search (needs pg_trgm, the migration skips them on servers without the extension)
+        Index('ix_contacts_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('ix_contacts_last_name_trgm', 'last_name',
+              postgresql_using='gin', postgresql_ops={'last_name': 'gin_trgm_ops'}),
+        Index('ix_contacts_email_trgm', 'email', postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'}),
+        Index('ix_contacts_phone_text_trgm', 'phone_text',
+              postgresql_using='gin', postgresql_ops={'phone_text': 'gin_trgm_ops'}),
+        )
+
+
+class ContactChange(Base):
+    """The change feed (outbox): written by the trigger contacts_log_change of the contacts table 
+    (migration e3b7c9d2f418) in the transaction of the change, never by the application."""
+    __tablename__: str = "contact_changes"
+    seq = Column(BigInteger, primary_key=True)
+    # the transaction of the change: the feed is read in (txid, seq) order, only below the oldest running transaction
+    txid = Column(BigInteger, nullable=False, server_default=text('txid_current()'))
+    contact_id = Column(Integer, nullable=False)
+    op = Column(String(6), nullable=False)  # create / update / delete
+    version = Column(Integer, nullable=False)
+    data = Column(JSONB, nullable=True)  # the fields of ContactResponse after the change, None for a delete
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_contact_changes_txid_seq', 'txid', 'seq'),
+        )
@@ -0,0 +1,116 @@
+# спостереження за базою даних: статистика пулу з'єднань та журнал повільних запитів
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolStats:
+    """Counters of the connection checkouts: how many, how long they waited (ms), how many timed out."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def add_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds * 1000
+        self.wait_max = max(self.wait_max, seconds * 1000)
+
+
+class TimedPoolMixin:
+    """Times every checkout of a connection from the pool (the wait for a free one, or the connect of a new one)."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()  # a new pool (after dispose) starts with new counters
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+
+        except PoolTimeoutError:  # no connection within pool_timeout (pool_size + max_overflow are checked out)
+            self.stats.timeouts += 1
+            raise
+
+        finally:
+            self.stats.add_wait(time.perf_counter() - start)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """The state of the pool of the engine (sync, or the sync_engine of an AsyncEngine) and its counters."""
+    pool = engine.pool
+    stats = getattr(pool, 'stats', None)
+    result = {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),  # negative while the pool is not filled yet
+        'max_overflow': pool._max_overflow,
+        'timeout': pool.timeout(),
+    }
+    if stats is not None:
+        result.update({
+            'checkouts': stats.checkouts,
+            'timeouts': stats.timeouts,
+            'wait_ms_total': round(stats.wait_total, 3),
+            'wait_ms_avg': round(stats.wait_total / stats.checkouts, 3) if stats.checkouts else 0.0,
+            'wait_ms_max': round(stats.wait_max, 3),
+        })
+
+    return result
+
+
+# (statement, seconds) of every executed statement, called in the thread (or greenlet) that executed it
+query_observers: List[Callable[[str, float], None]] = []
+# the same, only for the statements of the primary (not of the replicas): what proves the primary is up
+primary_query_observers: List[Callable[[str, float], None]] = []
+
+
+def time_queries(engine: Engine, replica: bool = False) -> None:
+    """Time every statement of the engine (sync, or the sync_engine of an AsyncEngine) for the query_observers
+    (and for the primary_query_observers, if the engine is not of a replica)."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        for observer in query_observers:
+            observer(statement, elapsed)
+        if not replica:
+            for observer in primary_query_observers:
+                observer(statement, elapsed)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context) -> None:  # a failed statement has no after_cursor_execute
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+
+def slow_query_logger(threshold_ms: float, sample_rate: float = 1.0) -> Callable[[str, float], None]:
+    """An observer that logs (a sample_rate share of) the statements that took threshold_ms or more,
+    instead of echoing them all."""
+
+    def log_slow_query(statement: str, elapsed: float) -> None:
+        if elapsed * 1000 >= threshold_ms and random.random() < sample_rate:
+            logging.warning(f'Slow query ({elapsed * 1000:.1f} ms): {statement}')
+
+    return log_slow_query
@@ -0,0 +1,122 @@
+# виконання блокуючих (psycopg2) запитів у обмеженому пулі потоків
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+
+class BoundedExecutor:
+    """A thread pool with a hard limit on the number of calls (running + waiting) it accepts.
+
+    When the limit is reached, new calls are rejected at once with 503, instead of queuing
+    without bound while they wait for a free worker (and a free DB connection)."""
+
+    def __init__(self, workers: int, queue_depth: int) -> None:
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.pending = 0  # only touched from the event loop thread
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db-offload')
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.workers + self.queue_depth
+
+    def check_capacity(self) -> None:
+        """Reject the request (503) if the pool has no room left."""
+        if self.saturated:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail='Database pool is saturated, try again later',
+                                headers={'Retry-After': '1'})
+
+    async def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Run a blocking function in the pool and wait for its result."""
+        self.check_capacity()
+        return await self.release(function, *args, **kwargs)
+
+    async def release(self, function: Callable, *args, **kwargs) -> Any:
+        """Run a call in the pool without the capacity check (for cleanup that frees a connection)."""
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()  # keep the request context (logging, metrics) in the worker
+            return await loop.run_in_executor(self._executor, partial(context.run, function, *args, **kwargs))
+
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class OffloadSession:
+    """Awaitable facade over a sync Session, with the same calls the repository makes on an AsyncSession.
+
+    Every call that can do IO is run in the BoundedExecutor, so the event loop is never blocked by psycopg2."""
+
+    def __init__(self, session: Session, executor: BoundedExecutor) -> None:
+        self.sync_session = session
+        self.executor = executor
+
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    async def connection(self) -> Any:
+        return await self.executor.run(self.sync_session.connection)
+
+    async def execute(self, *args, **kwargs) -> Any:
+        return await self.executor.run(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs) -> Any:
+        return await self.executor.run(self.sync_session.scalar, *args, **kwargs)
+
+    async def stream(self, statement: Any, *args, **kwargs) -> 'OffloadStreamResult':
+        """Execute with a server-side cursor (stream_results), rows are fetched later in batches."""
+        statement = statement.execution_options(stream_results=True)
+        result = await self.executor.run(self.sync_session.execute, statement, *args, **kwargs)
+        return OffloadStreamResult(result, self.executor)
+
+    async def scalars(self, *args, **kwargs) -> Any:
+        return await self.executor.run(self.sync_session.scalars, *args, **kwargs)
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    async def delete(self, instance: Any) -> None:
+        await self.executor.run(self.sync_session.delete, instance)
+
+    async def refresh(self, instance: Any) -> None:
+        await self.executor.run(self.sync_session.refresh, instance)
+
+    async def flush(self) -> None:
+        await self.executor.run(self.sync_session.flush)
+
+    # commit/rollback/close finish work that has already started, so they are never rejected
+    async def commit(self) -> None:
+        await self.executor.release(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await self.executor.release(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await self.executor.release(self.sync_session.close)
+
+
+class OffloadStreamResult:
+    """Async iteration over a streamed sync Result (like AsyncResult.partitions), every fetch runs in the pool."""
+
+    def __init__(self, result: Any, executor: BoundedExecutor) -> None:
+        self.result = result
+        self.executor = executor
+
+    async def partitions(self, size: int) -> AsyncIterator[List[Any]]:
+        while True:
+            rows = await self.executor.release(self.result.fetchmany, size)
+            if not rows:
+                break
+
+            yield rows
@@ -0,0 +1,143 @@
+# репліки для читання: по черзі (round-robin), непрацююча пропускається на RETRY_AFTER секунд
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.monitoring import pool_stats, time_queries, TimedAsyncQueuePool, TimedQueuePool
+
+
+class Replica:
+    """A read replica: the engines (async, and sync for the offload mode) and its health.
+
+    The sessions are marked with info={'replica': True}: what is read from them may lag behind the primary,
+    so the repository does not put it into the contact cache."""
+
+    def __init__(self, name: str, url: str, async_url: str, pool_options: Dict[str, Any], connect_timeout: int) -> None:
+        self.name = name
+        # a short connect timeout: an unreachable replica is given up quickly, and the next one is tried
+        self.engine = create_engine(url, poolclass=TimedQueuePool, connect_args={'connect_timeout': connect_timeout},
+                                    **pool_options)
+        self.async_engine = create_async_engine(async_url, poolclass=TimedAsyncQueuePool,
+                                                connect_args={'timeout': connect_timeout}, **pool_options)
+        time_queries(self.engine, replica=True)
+        time_queries(self.async_engine.sync_engine, replica=True)
+        self.session = sessionmaker(autoflush=False, bind=self.engine, info={'replica': True})
+        self.async_session = async_sessionmaker(bind=self.async_engine, autoflush=False,
+                                                expire_on_commit=False, info={'replica': True})
+        self.down_until = 0.0  # time.monotonic() before which the replica is skipped
+        self.reads = 0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {'name': self.name, 'healthy': self.healthy, 'reads': self.reads, 'failures': self.failures,
+                'async': pool_stats(self.async_engine.sync_engine), 'sync': pool_stats(self.engine)}
+
+
+class ReplicaSet:
+    """The replicas in turn (round-robin), without the ones that failed recently (they are retried after
+    retry_after seconds). With no healthy replica left the reads go to the primary."""
+
+    def __init__(self, replicas: List[Replica], retry_after: float) -> None:
+        self.replicas = replicas
+        self.retry_after = retry_after
+        self.primary_reads = 0  # reads that were meant for a replica, but had to go to the primary
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def candidates(self) -> Iterator[Replica]:
+        """The healthy replicas, starting with the next one in turn."""
+        with self._lock:
+            start = next(self._next)
+
+        for shift in range(len(self.replicas)):
+            replica = self.replicas[(start + shift) % len(self.replicas)]
+            if replica.healthy:
+                yield replica
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.retry_after
+        logging.warning(f'Replica {replica.name} is down for {self.retry_after} s: {error}')
+
+    def stats(self) -> Dict[str, Any]:
+        return {'primary_reads': self.primary_reads, 'replicas': [replica.stats() for replica in self.replicas]}
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.async_engine.dispose()
+            replica.engine.dispose()
+
+
+class ReplicaReadSession:
+    """The session of a read request on the next healthy replica, with the same calls the read routes make.
+
+    The connection is taken at the first query, not up front: a request answered from a cache (or with 304)
+    takes none. A replica that does not answer then is marked down, and the query goes to the next one,
+    then to the primary. open_session(replica) makes a session of the replica, open_session(None) of the primary."""
+
+    def __init__(self, replicas: ReplicaSet, open_session: Callable[[Optional[Replica]], Any]) -> None:
+        self.replicas = replicas
+        self.open_session = open_session
+        self._candidates = replicas.candidates()
+        self._connected = False
+        self._open_next()
+
+    def _open_next(self) -> None:
+        self.replica = next(self._candidates, None)
+        if self.replica is None:
+            self.replicas.primary_reads += 1
+        self.db = self.open_session(self.replica)  # no connection yet
+
+    @property
+    def info(self) -> dict:
+        return self.db.info
+
+    async def _connect(self) -> Any:
+        while not self._connected and self.replica is not None:
+            try:
+                await self.db.connection()  # pool_pre_ping: a dead connection is replaced, a dead server raises here
+                self._connected = True
+                self.replica.reads += 1
+
+            except (DBAPIError, OSError) as error:
+                await self.db.close()
+                self.replicas.mark_down(self.replica, error)
+                self._open_next()
+        return self.db
+
+    async def execute(self, *args, **kwargs) -> Any:
+        return await (await self._connect()).execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs) -> Any:
+        return await (await self._connect()).scalar(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs) -> Any:
+        return await (await self._connect()).scalars(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs) -> Any:
+        return await (await self._connect()).stream(*args, **kwargs)
+
+    async def rollback(self) -> None:
+        await self.db.rollback()
+
+    async def close(self) -> None:
+        await self.db.close()
+
+
+def is_replica(db: Any) -> bool:
+    """True for a session of a read replica (AsyncSession, or OffloadSession over a sync one)."""
+    return bool(db.info.get('replica'))
@@ -0,0 +1,187 @@
+# метрики у текстовому форматі Prometheus: запити, затримки за шаблоном маршруту, запити до БД за запит
+import contextvars
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.monitoring import query_observers
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)  # statements per request: N+1 shows up in the high ones
+
+
+registry: List['Metric'] = []
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], **extra: Any) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra.items())]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    """A metric with a fixed set of label names, its series are kept by the tuple of the label values.
+    Updates may come from the offload threads, so they are made under a lock."""
+
+    kind = ''
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{_labels(self.label_names, labels)} {value}' for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels: [counts per bucket (not cumulative), sum, count]
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le=bound)} {cumulative}')
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le="+Inf")} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests', ('method', 'route', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'HTTP request latency', ('method', 'route'))
+http_in_progress = Gauge('http_requests_in_progress', 'HTTP requests being served')
+request_queries = Histogram('http_request_db_queries', 'DB statements per HTTP request', ('method', 'route'),
+                            buckets=QUERY_COUNT_BUCKETS)
+request_db_time = Histogram('http_request_db_seconds', 'DB time per HTTP request', ('method', 'route'))
+db_queries = Counter('db_queries_total', 'DB statements (all, in and out of requests)')
+db_time = Counter('db_query_seconds_total', 'DB time (all, in and out of requests)')
+
+
+class RequestDB:
+    """DB statements of one request: shared (not copied) by the contexts the request runs in."""
+
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db: contextvars.ContextVar[Optional[RequestDB]] = contextvars.ContextVar('request_db', default=None)
+
+
+def observe_query(statement: str, elapsed: float) -> None:
+    db_queries.inc()
+    db_time.inc(amount=elapsed)
+    request_db = _request_db.get()
+    if request_db is not None:
+        request_db.queries += 1
+        request_db.seconds += elapsed
+
+
+query_observers.append(observe_query)
+
+
+def route_template(scope: Scope) -> str:
+    """The path of the matched route (/api/contacts/{contact_id}), not the raw path: one series per route."""
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+class MetricsMiddleware:
+    """ASGI middleware: counts and times every HTTP request (to the end of the body, also for streaming)
+    and the DB statements it executed."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # if the app fails before it starts the response
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        request_db = RequestDB()
+        token = _request_db.set(request_db)
+        http_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_progress.dec()
+            _request_db.reset(token)
+            method, route = scope['method'], route_template(scope)
+            http_requests.inc(method, route, str(status_code))
+            http_latency.observe(elapsed, method, route)
+            request_queries.observe(request_db.queries, method, route)
+            request_db_time.observe(request_db.seconds, method, route)
+
+
+def render() -> str:
+    """All the metrics in the Prometheus text format (version 0.0.4)."""
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
@@ -0,0 +1,108 @@
+# профілювання одного запиту за бажанням: cProfile + SQL-запити з часом, у файли (pstats та json)
+import contextvars
+import cProfile
+import hmac
+import json
+import logging
+import pathlib
+import re
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.monitoring import query_observers
+from src.settings import config
+
+
+PROFILE_HEADER = 'x-profile'  # X-Profile: <secret>, or ?profile=<secret>
+
+# (statement, seconds) of the request being profiled
+_statements: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar('statements', default=None)
+
+
+def record_statement(statement: str, elapsed: float) -> None:
+    statements = _statements.get()
+    if statements is not None:
+        statements.append((statement, elapsed))
+
+
+query_observers.append(record_statement)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: a request that carries the secret (header or query) is run under cProfile,
+    the stats are saved to <directory>/<id>.pstats (snakeviz, python -m pstats) and its SQL statements
+    with their times to <id>.sql.json. The id is returned in the X-Profile-Id header.
+
+    cProfile sees the event loop thread only: in the offload mode the time of the statements is in the json.
+    One request is profiled at a time, the others (even with the secret) are served as usual."""
+
+    def __init__(self, app: ASGIApp, secret: str, directory: str) -> None:
+        self.app = app
+        self.secret = secret.encode()
+        self.directory = pathlib.Path(directory)
+        self.busy = False
+
+    def _requested(self, scope: Scope) -> bool:
+        value = dict(scope['headers']).get(PROFILE_HEADER.encode())
+        if value is None:
+            value = parse_qs(scope.get('query_string', b'').decode()).get('profile', [''])[0].encode()
+        return bool(value) and hmac.compare_digest(value, self.secret)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or self.busy or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        path = re.sub(r'[^A-Za-z0-9]+', '_', scope['path'])
+        profile_id = f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(now))}-{int(now * 1000) % 1000:03d}-{scope["method"]}{path}'
+
+        async def send_with_id(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                message['headers'] = [*message.get('headers', []), (b'x-profile-id', profile_id.encode())]
+            await send(message)
+
+        self.busy = True
+        statements = []
+        token = _statements.set(statements)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            _statements.reset(token)
+            self.busy = False
+            self._save(profile_id, profiler, statements, elapsed)
+
+    def _save(self, profile_id: str, profiler: cProfile.Profile, statements: List[Tuple[str, float]],
+              elapsed: float) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.directory / f'{profile_id}.pstats')
+        report = {
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'sql_count': len(statements),
+            'sql_ms': round(sum(seconds for _, seconds in statements) * 1000, 3),
+            'statements': [{'ms': round(seconds * 1000, 3), 'sql': sql} for sql, seconds in statements],
+        }
+        (self.directory / f'{profile_id}.sql.json').write_text(json.dumps(report, indent=2))
+        logging.info(f'Profile {profile_id}: {report["elapsed_ms"]} ms, {report["sql_count"]} statements')
+
+
+def profiling_options() -> Optional[dict]:
+    """The options of the middleware from the [PROFILING] section, None if it is off (or has no secret)."""
+    if not config.getboolean('PROFILING', 'enabled', fallback=False):
+        return None
+
+    secret = config.get('PROFILING', 'secret', fallback='')
+    if not secret:
+        logging.error('Profiling is enabled without a SECRET: it stays off')
+        return None
+
+    return {'secret': secret, 'directory': config.get('PROFILING', 'directory', fallback='profiles')}
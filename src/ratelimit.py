@@ -0,0 +1,247 @@
+# обмеження запитів: token bucket на клієнта (ціна за маршрутом) та загальне обмеження одночасних запитів
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match, Router
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.metrics import Counter, Gauge
+from src.settings import config
+
+try:
+    import redis.asyncio as redis  # poetry install -E cache
+except ImportError:
+    redis = None
+
+
+requests_rejected = Counter('http_requests_rejected_total', 'HTTP requests rejected before they were served',
+                            ('reason',))
+requests_queued = Gauge('http_requests_queued', 'HTTP requests waiting for a free slot (concurrency limit)')
+
+
+class LocalBucketBackend:
+    """Token buckets kept in this process (also the stand-in for RedisBucketBackend in tests and dev).
+
+    At most max_clients buckets are kept: the one used least recently is dropped (its client starts anew
+    with a full bucket), so random keys can't grow the table without bound."""
+
+    def __init__(self, max_clients: int) -> None:
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()  # key: (tokens, time.monotonic() of the last take)
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """Take cost tokens from the bucket of the key: 0 if taken, else the seconds until there are enough."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# refill and take in one step on the server (atomic for all the workers), by the clock of Redis
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'last', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBucketBackend:
+    """Shared token buckets: one limit per client for all the workers (and instances) of the application."""
+
+    def __init__(self, url: str) -> None:
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._take = self._redis.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        return float(await self._take(keys=[f'ratelimit:{key}'], args=[rate, burst, cost]))
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse({'detail': detail}, status_code=status_code,
+                        headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+
+def _exempt(scope: Scope, exempt: Tuple[str, ...]) -> bool:
+    return scope['type'] != 'http' or scope['path'].startswith(exempt)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: a token bucket per client (the API key header, or the IP address without it),
+    refilled with rate tokens per second up to burst. A request costs the tokens of its route (the route
+    template in costs, 1 by default), so a full-scan search costs more than a lookup by id.
+    Without enough tokens - 429 with Retry-After, before any work (and any DB connection) is done.
+
+    The API key is not verified (the application has no authentication): it separates the clients that send it."""
+
+    def __init__(self,
+                 app: ASGIApp,
+                 router: Router,
+                 backend: Union[LocalBucketBackend, RedisBucketBackend],
+                 rate: float,
+                 burst: float,
+                 costs: Dict[str, float],
+                 key_header: str = 'x-api-key',
+                 exempt: Tuple[str, ...] = ()) -> None:
+        self.app = app
+        self.router = router
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.costs = costs
+        self.key_header = key_header.lower().encode()
+        self.exempt = exempt
+
+    def _route(self, scope: Scope) -> Optional[str]:
+        """The template of the route the request goes to (the router matches it again, it is cheap)."""
+        for route in self.router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                scope['route'] = route  # so the rejected requests are counted by route in the metrics too
+                return getattr(route, 'path', None)
+
+        return None
+
+    def _client(self, scope: Scope) -> str:
+        key = dict(scope['headers']).get(self.key_header)
+        if key:
+            return f'key:{key.decode("latin-1")}'
+
+        client = scope.get('client')
+        return f'ip:{client[0] if client else "unknown"}'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if _exempt(scope, self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        cost = min(self.costs.get(self._route(scope), 1), self.burst)  # more than burst would never pass
+        try:
+            wait = await self.backend.take(self._client(scope), cost, self.rate, self.burst)
+
+        except Exception as error:  # the shared backend is down: serve rather than reject everyone
+            logging.error(f'Rate limit backend error: {error}')
+            wait = 0.0
+
+        if wait > 0:
+            requests_rejected.inc('rate_limited')
+            await _reject(429, 'Too many requests', wait)(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware: at most max_in_flight requests are served at once (about the connections of the DB pool),
+    up to max_queue more wait for a slot for queue_timeout seconds. The rest - 503 with Retry-After at once,
+    so an overload is shed here instead of piling up in the wait for a DB connection (pool timeout)."""
+
+    def __init__(self,
+                 app: ASGIApp,
+                 max_in_flight: int,
+                 max_queue: int,
+                 queue_timeout: float,
+                 exempt: Tuple[str, ...] = ()) -> None:
+        self.app = app
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.exempt = exempt
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def _acquire(self) -> bool:
+        if not self._slots.locked():
+            await self._slots.acquire()  # a free slot: does not wait
+            return True
+
+        if self.waiting >= self.max_queue:
+            return False
+
+        self.waiting += 1
+        requests_queued.inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+
+        except asyncio.TimeoutError:
+            return False
+
+        finally:
+            self.waiting -= 1
+            requests_queued.dec()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if _exempt(scope, self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self._acquire():
+            requests_rejected.inc('overloaded')
+            await _reject(503, 'Server is overloaded, try again later', self.queue_timeout)(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+
+        finally:
+            self._slots.release()
+
+
+def _exempt_paths(section: str) -> Tuple[str, ...]:
+    return tuple(path.strip() for path in config.get(section, 'exempt', fallback='').split(',') if path.strip())
+
+
+def rate_limit_options() -> Optional[dict]:
+    """The options of RateLimitMiddleware from the [RATE_LIMIT] and [RATE_LIMIT_COSTS] sections, None if it is off.
+    SHARED_URL: empty - the buckets of this worker, 'local' - the same in-process stand-in, redis://... - shared."""
+    if not config.getboolean('RATE_LIMIT', 'enabled', fallback=False):
+        return None
+
+    shared_url = config.get('RATE_LIMIT', 'shared_url', fallback='')
+    backend = LocalBucketBackend(config.getint('RATE_LIMIT', 'max_clients', fallback=100000))
+    if shared_url and shared_url != 'local':
+        if redis is None:
+            logging.error('Shared rate limit is not available: redis is not installed (poetry install -E cache)')
+        else:
+            backend = RedisBucketBackend(shared_url)
+
+    costs = {route: float(cost) for route, cost in config.items('RATE_LIMIT_COSTS')} \
+        if config.has_section('RATE_LIMIT_COSTS') else {}
+    return {'backend': backend,
+            'rate': config.getfloat('RATE_LIMIT', 'rate', fallback=50),
+            'burst': config.getfloat('RATE_LIMIT', 'burst', fallback=100),
+            'costs': costs,
+            'key_header': config.get('RATE_LIMIT', 'key_header', fallback='X-API-Key'),
+            'exempt': _exempt_paths('RATE_LIMIT')}
+
+
+def concurrency_limit_options() -> Optional[dict]:
+    """The options of ConcurrencyLimitMiddleware from the [CONCURRENCY] section, None if MAX_IN_FLIGHT is 0."""
+    max_in_flight = config.getint('CONCURRENCY', 'max_in_flight', fallback=0)
+    if max_in_flight <= 0:
+        return None
+
+    return {'max_in_flight': max_in_flight,
+            'max_queue': config.getint('CONCURRENCY', 'max_queue', fallback=max_in_flight),
+            'queue_timeout': config.getfloat('CONCURRENCY', 'queue_timeout', fallback=1.0),
+            'exempt': _exempt_paths('CONCURRENCY')}
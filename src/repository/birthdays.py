@@ -0,0 +1,62 @@
+# наступні дні народження (next_birthday): дні народження, що минули, переносяться на наступний рік у фоні
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db_connect import get_db_session
+from src.database.models import Contact
+from src.settings import config
+
+
+async def roll_forward(db: AsyncSession) -> int:
+    """Move the birthdays that have passed to the next year: only these rows (about 1/365 of them a day,
+    found by the index), the version, updated_at and the change feed are not touched - the record did not change."""
+    result = await db.execute(update(Contact.__table__)
+                              .where(Contact.next_birthday < func.current_date())
+                              # the function of the trigger (migration f5a8d2c61e90) that sets it for a new birthday
+                              .values(next_birthday=func.contacts_next_birthday(Contact.birthday, func.current_date()),
+                                      updated_at=Contact.updated_at))  # not onupdate=func.now(): not a change
+    await db.commit()
+    return result.rowcount
+
+
+class BirthdayRoller:
+    """Runs roll_forward at the start and then every interval seconds (the day changes at midnight of the database
+    server, not of this one). Every worker runs it: the first one moves the rows, for the others there are none."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with asynccontextmanager(get_db_session)() as db:
+                    moved = await roll_forward(db)
+                if moved:
+                    logging.info(f'Next birthdays rolled forward: {moved}')
+
+            except Exception as error:  # the database is down: the next run does it
+                logging.warning(f'Next birthdays were not rolled forward: {type(error).__name__}: {error}')
+
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+birthday_roller = BirthdayRoller(interval=config.getfloat('BIRTHDAYS', 'roll_interval', fallback=3600))
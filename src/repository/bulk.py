@@ -0,0 +1,62 @@
+# потокове читання NDJSON/CSV для масового імпорту контактів
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, Tuple, Union
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split the request body into lines as it arrives, without reading the whole body."""
+    tail = b''
+    async for chunk in stream:
+        *lines, tail = (tail + chunk).split(b'\n')
+        for line in lines:
+            yield line.rstrip(b'\r')
+
+    if tail:
+        yield tail.rstrip(b'\r')
+
+
+async def iter_records(stream: AsyncIterator[bytes],
+                       fmt: str) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """Yield (row number, record) for every non-empty line: a dict of fields, or an error text for a broken line
+    (not UTF-8, not JSON, a wrong number of values). CSV: the first line is the header (row 0 if it is broken:
+    the rows can't be read without it), empty cells are left out (the model defaults apply),
+    a quoted value must not span lines."""
+    header = None
+    row = 0
+    async for raw_line in iter_lines(stream):
+        if not raw_line.strip():
+            continue
+
+        if fmt != 'csv' or header is not None:
+            row += 1
+        try:
+            line = raw_line.decode('utf-8')
+
+        except UnicodeDecodeError as error:
+            yield row, f'Invalid UTF-8: {error}'
+            if header is None and fmt == 'csv':
+                return
+            continue
+
+        if fmt == 'csv':
+            cells = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in cells]
+                continue
+
+            if len(cells) != len(header):
+                yield row, f'Expected {len(header)} values, got {len(cells)}'
+                continue
+
+            yield row, {name: value for name, value in zip(header, cells) if value != ''}
+
+        else:
+            try:
+                record = json.loads(line)
+
+            except ValueError as error:
+                yield row, f'Invalid JSON: {error}'
+                continue
+
+            yield row, record if isinstance(record, dict) else 'Expected a JSON object'
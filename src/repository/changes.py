@@ -0,0 +1,89 @@
+# стрічка змін контактів (outbox): інкрементальні зміни з ?since=<seq> замість повторного читання всієї таблиці
+import asyncio
+import time
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import ColumnElement, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import ContactChange
+from src.schemes import ChangeFeed, ChangesParams, ContactChangeResponse
+from src.settings import config
+
+
+class ChangeNotifier:
+    """Wakes the long-polls of this process when a write of this process is committed.
+    The writes of the other workers (processes) are found by the next query, every poll_interval seconds."""
+
+    def __init__(self, poll_interval: float) -> None:
+        self.poll_interval = poll_interval
+        self._event: Optional[asyncio.Event] = None
+
+    def event(self) -> asyncio.Event:
+        """The event of the next commit: taken before the query, so a commit during the query is not missed."""
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def notify(self) -> None:
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(event.wait(), min(timeout, self.poll_interval))
+        except asyncio.TimeoutError:
+            pass
+
+
+# rows, not ORM objects: the rollback before the wait would expire them
+FEED_COLUMNS = (ContactChange.seq, ContactChange.contact_id, ContactChange.op, ContactChange.version,
+                ContactChange.changed_at, ContactChange.data)
+
+
+change_notifier = ChangeNotifier(poll_interval=config.getfloat('CHANGES', 'poll_interval', fallback=1))
+
+
+def _committed() -> ColumnElement:
+    """Only the changes of the transactions older than the oldest running one: seq is taken at the write,
+    not at the commit, so a running transaction may still add a change before the ones already committed
+    (reading by seq alone would skip it for good). The order of the feed is (txid, seq) for the same reason."""
+    return ContactChange.txid < func.txid_snapshot_xmin(func.txid_current_snapshot())
+
+
+async def _position(since: int, db: AsyncSession) -> Tuple[int, int]:
+    """(txid, seq) of the last change the client has received."""
+    if not since:
+        return 0, 0
+
+    position = (await db.execute(select(ContactChange.txid, ContactChange.seq).filter_by(seq=since))).first()
+    if position is None:  # deleted as too old (or never was): the client has to read the records again
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=f'No change {since}: read /contacts/ again')
+    return tuple(position)
+
+
+async def get_changes(params: ChangesParams,
+                      db: AsyncSession) -> ChangeFeed:
+    """The changes after the one with seq = since, in commit order. With wait - long-polling: if there are none yet,
+    the request waits (without a pooled connection) for a commit, at most (wait) seconds."""
+    position = await _position(params.since, db)
+    deadline = time.monotonic() + params.wait
+    while True:
+        woken = change_notifier.event()
+        rows = (await db.execute(select(*FEED_COLUMNS)
+                                 .filter(_committed(), tuple_(ContactChange.txid, ContactChange.seq) > position)
+                                 .order_by(ContactChange.txid, ContactChange.seq)
+                                 .limit(params.limit))).all()
+        await db.rollback()  # the connection goes back to the pool while waiting
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            break
+        await change_notifier.wait(woken, remaining)
+
+    return ChangeFeed(changes=[ContactChangeResponse(seq=change.seq, contact_id=change.contact_id, op=change.op,
+                                                     version=change.version, changed_at=change.changed_at,
+                                                     contact=change.data)
+                               for change in rows],
+                      last_seq=rows[-1].seq if rows else params.since)
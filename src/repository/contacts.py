@@ -1,159 +1,608 @@
 # функції для взаємодії з базою даних.
-from datetime import date, timedelta
-from typing import Optional
+import csv
+from datetime import date
+from functools import partial
+import io
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
 from fastapi import HTTPException, status
-from fastapi_pagination import Page  # , paginate  # poetry add fastapi-pagination
-from fastapi_pagination.ext.sqlalchemy import paginate
-# from fastapi_pagination.ext.sqlmodel import paginate
-from sqlalchemy import cast, func, String
-from sqlalchemy.orm import Session
-
+from fastapi_pagination.api import resolve_params
+from pydantic import ValidationError
+from sqlalchemy import (
+    any_,
+    bindparam,
+    case,
+    ColumnElement,
+    delete,
+    func,
+    insert,
+    Integer,
+    literal,
+    or_,
+    select,
+    Select,
+    update,
+    )
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import contact_cache
+from src.conditional import clear_page_cache, precondition_failed
 from src.database.models import Contact
-from src.schemes import ContactModel, CatToNameModel, ContactResponse
-
-
-async def get_contacts(db: Session) -> Optional[Page[ContactResponse]]:
+from src.database.replicas import is_replica
+from src.repository.changes import change_notifier
+from src.repository.keyset import paginate_keyset
+from src.repository.rows import paginate_rows, RowPage, select_rows
+from src.repository.singleflight import single_flight
+from src.schemes import (
+    BatchItemResult,
+    BatchReport,
+    BatchUpdateItem,
+    BulkImportReport,
+    BulkRowResult,
+    ContactModel,
+    ContactPartialModel,
+    CatToNameModel,
+    ContactCursorPage,
+    ContactResponse,
+    CursorParams,
+    ExportFilters,
+    )
+
+
+async def get_contacts(db: AsyncSession) -> Optional[RowPage]:
     """To retrieve a list of records from a database with the ability to skip 
     a certain number of records and limit the number returned."""
     # return db.query(Contact).limit(limit).offset(offset).all()
-    return paginate(db.query(Contact).order_by(Contact.name))
+    return await paginate_rows(db, select_rows().order_by(Contact.name))
+
+
+def _fills_cache(db: AsyncSession) -> bool:
+    """A record read from a replica may be older than the primary one (replication lag): 
+    it is returned, but not cached - the cache would keep it after the invalidation by the write."""
+    return contact_cache is not None and not is_replica(db)
+
+
+async def _shared(key: Tuple[Any, ...], db: AsyncSession, load: Callable[[], Awaitable[Any]]) -> Any:
+    """load() once for the identical concurrent reads (key: the name of the read and its arguments). 
+    The source of the session is a part of the key: a read from the primary never gets the result of a replica."""
+    if single_flight is None:
+        return await load()
+
+    return await single_flight.do((*key, is_replica(db)), load)
+
+
+async def _load(query: Select, db: AsyncSession, *lookup: str) -> Optional[Contact]:
+    """The record from the database, then cached (see _fills_cache) - if no write was invalidated meanwhile."""
+    generation = contact_cache.generation if contact_cache is not None else None
+    contact = await db.scalar(query)
+    if contact is not None and _fills_cache(db):
+        await contact_cache.put(contact, *lookup, generation=generation)
+    return contact
+
+
+async def _shared_page(key: Tuple[Any, ...], db: AsyncSession, load: Callable[[], Awaitable[RowPage]]) -> RowPage:
+    """load() once for the identical concurrent reads of the same page (the page and size are a part of the key)."""
+    params = resolve_params()
+    return await _shared((*key, params.page, params.size), db, load)
 
 
 async def get_contact(contact_id: int,
-                      db: Session) -> Optional[Contact]:
-    """To get a particular record by its ID."""
+                      db: AsyncSession) -> Optional[Union[Contact, ContactResponse]]:
+    """To get a particular record by its ID (a burst of the same ID - one query)."""
     # return db.query(Contact).filter(Contact.id == contact_id).first()
-    return db.query(Contact).filter_by(id=contact_id).first()  
+    if contact_cache is not None:
+        contact = await contact_cache.get(contact_id)
+        if contact is not None:
+            return contact
+
+    return await _shared(('get_contact', contact_id), db, partial(_load, select(Contact).filter_by(id=contact_id), db))
+
+
+# unique indexes (constraints) -> the fields reported in 409
+DUPLICATE_FIELDS = {
+    'ix_contacts_email': 'email',
+    'ix_contacts_phone': 'phone',
+    'uq_contacts_name_last_name': 'name, last_name',
+}
+
+
+def _duplicate_error(error: IntegrityError) -> HTTPException:
+    """409 with the field(s) of the unique index hit by the INSERT/UPDATE."""
+    orig = error.orig
+    constraint = getattr(getattr(orig, 'diag', None), 'constraint_name', None)  # psycopg2
+    if constraint is None:  # asyncpg (the driver error is the cause of the DBAPI adapter one)
+        constraint = getattr(orig.__cause__, 'constraint_name', None)
+
+    field = DUPLICATE_FIELDS.get(constraint, constraint)
+    return HTTPException(status_code=status.HTTP_409_CONFLICT,
+                         detail=f'Duplicate data: {field}' if field else 'Duplicate data')
+
+
+async def _invalidate(*contacts: Contact, deleted: bool = False) -> None:
+    """Drop the changed (deleted) records from the cache, and the cached pages (a new record changes them too), 
+    the reads in flight are not shared any more, and the long-polls of the change feed are woken (it is committed).
+    The contacts as they were written (with the new version) or deleted."""
+    if contact_cache is not None:
+        await contact_cache.invalidate(*contacts, deleted=deleted)
+    clear_page_cache()
+    if single_flight is not None:
+        single_flight.forget()
+    change_notifier.notify()
 
 
 async def create_contact(body: ContactModel,
-                         db: Session) -> Optional[Contact]:
-    """Creating a new record in the database. Takes a ContactModel object and uses the information 
-    from it to create a new Contact object, then adds it to the session and 
-    commits the changes to the database."""
-    contact = (db.query(Contact).filter_by(email=body.email).first() or
-               db.query(Contact).filter_by(phone=body.phone).first() or
-               db.query(Contact).filter_by(name=body.name, last_name=body.last_name).first())
-    if contact:  # raise формує свою відповідь взамін return (все що після - відміняється):
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Duplicate data')
-    
-    contact = Contact(**body.dict())
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+                         db: AsyncSession) -> Optional[Contact]:
+    """Creating a new record in the database. Takes a ContactModel object and inserts it with one 
+    INSERT ... RETURNING (no separate duplicate checks and no refresh), then commits the changes. 
+    Duplicates are detected by the unique indexes (email, phone, name + last name) - 409."""
+    try:
+        contact = await db.scalar(insert(Contact).values(**body.dict()).returning(Contact))
+        await db.commit()
+
+    except IntegrityError as error:  # raise формує свою відповідь взамін return (все що після - відміняється):
+        await db.rollback()
+        raise _duplicate_error(error)
+
+    await _invalidate()
+    return contact
+
+
+BULK_CHUNK_SIZE = 1000  # rows per INSERT (7 parameters each, asyncpg takes up to 32767)
+
+
+async def _insert_chunk(chunk: List[Tuple[int, ContactModel]],
+                        report: BulkImportReport,
+                        db: AsyncSession) -> None:
+    """Insert validated rows with a multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING, 
+    the rows that are not returned hit a unique index (email, phone, name + last name)."""
+    taken, emails, phones = set(), set(), set()
+    rows = []
+    for row, body in chunk:  # duplicates of the rows above in the same chunk
+        if (body.name, body.last_name) in taken or body.email in emails or body.phone in phones:
+            report.duplicates += 1
+            report.rows.append(BulkRowResult(row=row, status='duplicate', detail='Duplicate data'))
+            continue
+
+        taken.add((body.name, body.last_name))
+        emails.add(body.email)
+        phones.add(body.phone)
+        rows.append((row, body))
+
+    if not rows:
+        return
+
+    # executemany form: compiled once (cached) and sent as multi-row VALUES batches ("insertmanyvalues")
+    result = await db.execute(pg_insert(Contact.__table__).on_conflict_do_nothing().returning(Contact.email),
+                              [body.dict() for _, body in rows])
+    created = set(result.scalars())
+    await db.commit()
+    await _invalidate()
+
+    for row, body in rows:
+        if body.email in created:
+            report.created += 1
+        else:
+            report.duplicates += 1
+            report.rows.append(BulkRowResult(row=row, status='duplicate', detail='Duplicate data'))
+
+
+async def create_contacts_bulk(records: AsyncIterator[Tuple[int, Union[Dict[str, Any], str]]],
+                               db: AsyncSession) -> BulkImportReport:
+    """Creating many records from a stream of (row number, fields) - see repository.bulk.iter_records. 
+    Rows are validated by ContactModel and inserted in chunks (committed one by one), 
+    the report lists every row that was not created and why."""
+    report = BulkImportReport()
+    chunk = []
+    async for row, record in records:
+        if isinstance(record, str):  # the line could not be parsed
+            report.invalid += 1
+            report.rows.append(BulkRowResult(row=row, status='invalid', detail=record))
+            continue
+
+        try:
+            chunk.append((row, ContactModel.parse_obj(record)))
+
+        except ValidationError as error:
+            report.invalid += 1
+            report.rows.append(BulkRowResult(row=row, status='invalid', detail=error.errors()))
+            continue
+
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await _insert_chunk(chunk, report, db)
+            chunk = []
+
+    if chunk:
+        await _insert_chunk(chunk, report, db)
+
+    return report
+
+
+def _versions_match(versions: Optional[List[int]]) -> List[ColumnElement]:
+    """The If-Match condition: the record is changed only in one of the versions the client has seen."""
+    return [] if versions is None else [Contact.version.in_(versions)]
+
+
+async def _write_failed(contact_id: int,
+                        versions: Optional[List[int]],
+                        db: AsyncSession) -> None:
+    """Nothing was changed: the record does not exist (None is returned then), or it has another version - 412."""
+    if versions is not None and await db.scalar(select(Contact.id).filter_by(id=contact_id)) is not None:
+        raise precondition_failed()
+
+
+async def _update_returning(contact_id: int,
+                            changes: Dict[str, Any],
+                            versions: Optional[List[int]],
+                            db: AsyncSession) -> Optional[Contact]:
+    """One UPDATE ... RETURNING of the given fields (no SELECT before it, no read-modify-write race): 
+    the version is increased in the same statement, a hit unique index - 409."""
+    try:
+        contact = await db.scalar(update(Contact)
+                                  .filter(Contact.id == contact_id, *_versions_match(versions))
+                                  .values(version=Contact.version + 1, updated_at=func.now(), **changes)
+                                  .returning(Contact)
+                                  .execution_options(synchronize_session=False))
+        if contact is None:
+            await _write_failed(contact_id, versions, db)
+        await db.commit()
+
+    except IntegrityError as error:
+        await db.rollback()
+        raise _duplicate_error(error)
+
+    if contact is not None:
+        await _invalidate(contact)
     return contact
 
 
 async def update_contact(contact_id: int,
                          body: ContactModel,
-                         db: Session) -> Optional[Contact]:
-    """Update a specific record by its ID. Takes the ContactModel object and updates the information from it 
-    by the name of the record. If the record does not exist - None is returned."""
+                         db: AsyncSession,
+                         versions: Optional[List[int]] = None) -> Optional[Contact]:
+    """Update a specific record by its ID. Takes the ContactModel object and replaces all the fields 
+    of the record with it. If the record does not exist - None is returned."""
     # contact = db.query(Contact).filter(contact.id == contact_id).first()
-    contact = db.query(Contact).filter_by(id=contact_id).first()
-    if contact:
-        contact.name = body.name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.description = body.description
-        db.commit()
+    return await _update_returning(contact_id, body.dict(), versions, db)
+
+
+async def patch_contact(contact_id: int,
+                        body: ContactPartialModel,
+                        db: AsyncSession,
+                        versions: Optional[List[int]] = None) -> Optional[Union[Contact, ContactResponse]]:
+    """To update only the fields that are set in the body. An empty body changes nothing: 
+    the record is returned as it is (if it is in one of the versions)."""
+    changes = body.dict(exclude_unset=True)
+    if changes:
+        return await _update_returning(contact_id, changes, versions, db)
+
+    contact = await get_contact(contact_id, db)
+    if contact is not None and versions is not None and contact.version not in versions:
+        raise precondition_failed()
     return contact
 
 
 async def remove_contact(contact_id: int,
-                         db: Session) -> Optional[Contact]:
-    """Delete a specific record by its ID. If the record does not exist - None is returned."""
+                         db: AsyncSession,
+                         versions: Optional[List[int]] = None) -> Optional[Contact]:
+    """Delete a specific record by its ID with one DELETE ... RETURNING. If the record does not exist - None is returned."""
     # contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    contact = db.query(Contact).filter_by(id=contact_id).first()
-    if contact:
-        db.delete(contact)
-        db.commit()
+    contact = await db.scalar(delete(Contact)
+                              .filter(Contact.id == contact_id, *_versions_match(versions))
+                              .returning(Contact)
+                              .execution_options(synchronize_session=False))
+    if contact is None:
+        await _write_failed(contact_id, versions, db)
+    await db.commit()
+    if contact is not None:
+        await _invalidate(contact, deleted=True)
     return contact
 
 
 async def change_name_contact(body: CatToNameModel,
                               contact_id: int,
-                              db: Session) -> Optional[Contact]:
+                              db: AsyncSession,
+                              versions: Optional[List[int]] = None) -> Optional[Contact]:
     """To update only the name of the record."""
-    contact = db.query(Contact).filter_by(id=contact_id).first()
-    if contact:
-        contact.name = body.name
-        db.commit()
-    return contact
+    return await _update_returning(contact_id, {'name': body.name}, versions, db)
+
+
+# batches: one statement with an array of ids (WHERE id = ANY(:ids)) instead of a statement per id
+def _id_in(ids: List[int]) -> ColumnElement:
+    """WHERE id = ANY(:ids): one parameter and the same statement for any number of ids (not IN (:id_1, ...))."""
+    return Contact.id == any_(literal(ids, ARRAY(Integer)))
+
+
+async def get_contacts_batch(ids: List[int],
+                             db: AsyncSession) -> BatchReport:
+    """To get the records by their IDs: the cached ones from the cache, the others with one query."""
+    found = await contact_cache.get_many(ids) if contact_cache is not None else {}
+    missing = [contact_id for contact_id in ids if contact_id not in found]
+    if missing:
+        generation = contact_cache.generation if contact_cache is not None else None
+        for contact in await db.scalars(select(Contact).filter(_id_in(missing))):
+            found[contact.id] = contact
+            if _fills_cache(db):
+                await contact_cache.put(contact, generation=generation)
+
+    return BatchReport(results=[BatchItemResult(id=contact_id, status='found', contact=found[contact_id])
+                                if contact_id in found else BatchItemResult(id=contact_id, status='not_found')
+                                for contact_id in ids])
+
+
+async def update_contacts_batch(items: List[BatchUpdateItem],
+                                db: AsyncSession) -> BatchReport:
+    """To update only the given fields of the records by their IDs, in one transaction: a bulk UPDATE 
+    (executemany) per set of changed fields, then one query for the results. A hit unique index - 409 for all."""
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}  # the same SET clause for the items with the same fields
+    for item in items:
+        changes = item.dict(exclude_unset=True, exclude={'id'})
+        if changes:
+            groups.setdefault(tuple(sorted(changes)), []).append(
+                {'b_id': item.id, **{f'b_{field}': value for field, value in changes.items()}})
+
+    ids = [item.id for item in items]
+    try:
+        for fields, rows in groups.items():
+            await db.execute(update(Contact.__table__)
+                             .where(Contact.id == bindparam('b_id'))
+                             .values(version=Contact.version + 1, updated_at=func.now(),
+                                     **{field: bindparam(f'b_{field}') for field in fields}),
+                             rows)
+        contacts = {contact.id: contact for contact in await db.scalars(select(Contact).filter(_id_in(ids)))}
+        await db.commit()
+
+    except IntegrityError as error:
+        await db.rollback()
+        raise _duplicate_error(error)
+
+    await _invalidate(*contacts.values())
+    changed = {row['b_id'] for rows in groups.values() for row in rows}
+    return BatchReport(results=[BatchItemResult(id=contact_id, contact=contacts[contact_id],
+                                                status='updated' if contact_id in changed else 'unchanged')
+                                if contact_id in contacts else BatchItemResult(id=contact_id, status='not_found')
+                                for contact_id in ids])
+
+
+async def remove_contacts_batch(ids: List[int],
+                                db: AsyncSession) -> BatchReport:
+    """To delete the records by their IDs with one DELETE ... RETURNING (the deleted records are returned)."""
+    deleted = {contact.id: contact for contact in await db.scalars(delete(Contact)
+                                                                   .filter(_id_in(ids))
+                                                                   .returning(Contact)
+                                                                   .execution_options(synchronize_session=False))}
+    await db.commit()
+    await _invalidate(*deleted.values(), deleted=True)
+
+    return BatchReport(results=[BatchItemResult(id=contact_id, status='deleted', contact=deleted[contact_id])
+                                if contact_id in deleted else BatchItemResult(id=contact_id, status='not_found')
+                                for contact_id in ids])
+
+
+async def _find_by(field: str,
+                   value: Any,
+                   db: AsyncSession) -> Optional[Union[Contact, ContactResponse]]:
+    """The first record with the value of the field - from the cache, or from the database (then cached)."""
+    if contact_cache is not None:
+        contact = await contact_cache.get_by(field, value)
+        if contact is not None:
+            return contact
+
+    return await _shared((f'search_by_{field}', value), db,
+                         partial(_load, select(Contact).filter_by(**{field: value}).limit(1), db, field))
 
 
 async def search_by_name(name: str,
-                         db: Session) -> Optional[Contact]:
+                         db: AsyncSession) -> Optional[Union[Contact, ContactResponse]]:
     """To search for a record by a specific name."""
     # return db.query(Contact).filter(Contact.name == name).first()  # .all()
-    return db.query(Contact).filter_by(name=name).first()
+    return await _find_by('name', name, db)
 
 
 async def search_by_last_name(last_name: str,
-                              db: Session) -> Optional[Contact]:
+                              db: AsyncSession) -> Optional[Union[Contact, ContactResponse]]:
     """To search for a record by a specific last name."""
     # return db.query(Contact).filter(Contact.last_name == last_name).first()
-    return db.query(Contact).filter_by(last_name=last_name).first() 
+    return await _find_by('last_name', last_name, db)
 
 
 async def search_by_email(email: str,
-                          db: Session) -> Optional[Contact]:
+                          db: AsyncSession) -> Optional[Union[Contact, ContactResponse]]:
     """To search for a record by a certain email."""
     # return db.query(Contact).filter(Contact.email == email).first()
-    return db.query(Contact).filter_by(email=email).first()
+    return await _find_by('email', email, db)
 
 
 async def search_by_phone(phone: int,
-                          db: Session) -> Optional[Contact]:
+                          db: AsyncSession) -> Optional[Union[Contact, ContactResponse]]:
     """To search for a record by a certain phone."""
     # return db.query(Contact).filter(Contact.phone == phone).first()
-    return db.query(Contact).filter_by(phone=phone).first()
+    return await _find_by('phone', phone, db)
 
 
 # https://stackoverflow.com/questions/4926757/sqlalchemy-query-where-a-column-contains-a-substring
+# ILIKE '%x%' is served by the GIN trigram indexes (migration 8f3a2c6d1e47), so keep the bare column on the left
+def _like_name(part_name: str) -> ColumnElement:
+    return Contact.name.icontains(part_name)
+
+
+def _like_last_name(part_last_name: str) -> ColumnElement:
+    return Contact.last_name.icontains(part_last_name)
+
+
+def _like_email(part_email: str) -> ColumnElement:
+    return Contact.email.icontains(part_email)
+
+
+# https://stackoverflow.com/questions/23622993/postgresql-error-operator-does-not-exist-integer-character-varying
+# https://stackoverflow.com/questions/33946865/flask-sqlalchemy-postgresql-in-a-query-can-an-int-be-cast-to-a-string
+# cast(Contact.phone, String) can't use an index, phone_text is the same text stored (and indexed) by the DB
+def _like_phone(part_phone: int) -> ColumnElement:
+    return Contact.phone_text.contains(str(part_phone))
+
+
 async def search_by_like_name(part_name: str,
-                              db: Session) -> Optional[Page[ContactResponse]]:
+                              db: AsyncSession) -> Optional[RowPage]:
     """To search for an entry by a partial match in the name."""
-    return paginate(db.query(Contact).filter(Contact.name.icontains(part_name)))  # if default .all()
+    return await _shared_page(('search_by_like_name', part_name), db,  # if default .all()
+                              partial(paginate_rows, db, select_rows().filter(_like_name(part_name))))
 
 
 async def search_by_like_last_name(part_last_name: str,
-                                   db: Session) -> Optional[Page[ContactResponse]]:
+                                   db: AsyncSession) -> Optional[RowPage]:
     """To search for a record by a partial match in the last name."""
-    return paginate(db.query(Contact).filter(Contact.last_name.icontains(part_last_name))) 
+    return await _shared_page(('search_by_like_last_name', part_last_name), db,
+                              partial(paginate_rows, db, select_rows().filter(_like_last_name(part_last_name))))
 
 
 async def search_by_like_email(part_email: str,
-                               db: Session) -> Optional[Page[ContactResponse]]:
+                               db: AsyncSession) -> Optional[RowPage]:
     """To search for a record by a partial match in an email."""
-    return paginate(db.query(Contact).filter(Contact.email.icontains(part_email)))
+    return await _shared_page(('search_by_like_email', part_email), db,
+                              partial(paginate_rows, db, select_rows().filter(_like_email(part_email))))
 
 
-# https://stackoverflow.com/questions/23622993/postgresql-error-operator-does-not-exist-integer-character-varying
-# https://stackoverflow.com/questions/33946865/flask-sqlalchemy-postgresql-in-a-query-can-an-int-be-cast-to-a-string
 async def search_by_like_phone(part_phone: int,
-                               db: Session) -> Optional[Page[ContactResponse]]:
+                               db: AsyncSession) -> Optional[RowPage]:
     """To search for a record by a partial match in phone."""
-    return paginate(db.query(Contact).filter(cast(Contact.phone, String).icontains(str(part_phone))))
+    return await _shared_page(('search_by_like_phone', part_phone), db,
+                              partial(paginate_rows, db, select_rows().filter(_like_phone(part_phone))))
+
+
+# one query for "anything matching q": the OR of the (indexed) ILIKEs, ranked by similarity * field weight
+SEARCH_WEIGHTS = ((Contact.name, 1.0), (Contact.last_name, 0.9), (Contact.email, 0.7), (Contact.phone_text, 0.5))
+
+def _similarity(column: Any, q: str, trigram: bool) -> ColumnElement:
+    """pg_trgm similarity, or without the extension: exact 1, prefix 0.75, substring 0.5."""
+    if trigram:
+        return func.coalesce(func.similarity(column, q), 0)
+
+    return case((func.lower(column) == q.lower(), 1.0),
+                (column.istartswith(q), 0.75),
+                (column.icontains(q), 0.5),
+                else_=0.0)
+
+
+def _search_query(q: str, trigram: bool) -> Select:
+    rank = func.greatest(*[_similarity(column, q, trigram) * weight for column, weight in SEARCH_WEIGHTS])
+
+    return (select_rows()
+            .filter(or_(*[column.icontains(q) for column, _ in SEARCH_WEIGHTS]))
+            .order_by(rank.desc(), Contact.id))
+
+
+async def _search(q: str,
+                  db: AsyncSession) -> RowPage:
+    # pg_trgm of the database the session is on: checked per engine at the start (Database.connect)
+    return await paginate_rows(db, _search_query(q, bool(db.info.get('trigram'))))
+
+
+async def search(q: str,
+                 db: AsyncSession) -> Optional[RowPage]:
+    """To search for records by a partial match in the name, last name, email or phone (best matches first)."""
+    return await _shared_page(('search', q), db, partial(_search, q, db))
+
+
+# keyset (cursor) variants: opaque cursor of (name, id) for the listing and of id for the search results
+async def get_contacts_keyset(params: CursorParams,
+                              db: AsyncSession) -> ContactCursorPage:
+    """A page of the list of records ordered by name, after the cursor."""
+    return await paginate_keyset(db, select(Contact), (Contact.name, Contact.id), params)
+
+
+async def search_by_like_name_keyset(part_name: str,
+                                     params: CursorParams,
+                                     db: AsyncSession) -> ContactCursorPage:
+    """To search for an entry by a partial match in the name (a page after the cursor)."""
+    return await paginate_keyset(db, select(Contact).filter(_like_name(part_name)), (Contact.id,), params)
+
+
+async def search_by_like_last_name_keyset(part_last_name: str,
+                                          params: CursorParams,
+                                          db: AsyncSession) -> ContactCursorPage:
+    """To search for a record by a partial match in the last name (a page after the cursor)."""
+    return await paginate_keyset(db, select(Contact).filter(_like_last_name(part_last_name)), (Contact.id,), params)
+
+
+async def search_by_like_email_keyset(part_email: str,
+                                      params: CursorParams,
+                                      db: AsyncSession) -> ContactCursorPage:
+    """To search for a record by a partial match in an email (a page after the cursor)."""
+    return await paginate_keyset(db, select(Contact).filter(_like_email(part_email)), (Contact.id,), params)
+
+
+async def search_by_like_phone_keyset(part_phone: int,
+                                      params: CursorParams,
+                                      db: AsyncSession) -> ContactCursorPage:
+    """To search for a record by a partial match in phone (a page after the cursor)."""
+    return await paginate_keyset(db, select(Contact).filter(_like_phone(part_phone)), (Contact.id,), params)
+
+
+def _birthday_within_days_filter(meantime: int) -> ColumnElement:
+    """Birthdays from today to today + meantime days: one range of the index (next_birthday, id), 
+    any window (366 days and more: all the contacts with a birthday)."""
+    return Contact.next_birthday.between(func.current_date(), func.current_date() + meantime)
 
 
 # https://github.com/uriyyo/fastapi-pagination
 # https://uriyyo-fastapi-pagination.netlify.app/
 # https://stackoverflow.com/questions/16589208/attributeerror-while-querying-neither-instrumentedattribute-object-nor-compa
 async def search_by_birthday_celebration_within_days(meantime: int,   # Optional[List[Type[Contact]]]
-                                                     db: Session) -> Optional[Page[ContactResponse]]: 
-    """To find contacts celebrating birthdays in the next (meantime) days."""
-    today = date.today()
-    days_limit = date.today() + timedelta(meantime)
-    slide = 1 if days_limit.year - today.year else 0
-
-    # func.to_date(Contact.birthday.year, 'YYYY-MM-DD')
-    # func.to_char(Contact.birthday, 'MM-DD')
-    # https://stackoverflow.com/questions/12069236/sqlalchemy-select-to-date
-    # https://stackoverflow.com/questions/17333014/convert-selected-datetime-to-date-in-sqlalchemy
-    return paginate(db.query(Contact).filter(func.to_char(Contact.birthday,
-                                                          f'{slide}MM-DD') >= today.strftime(f"0%m-%d"),
-                                             func.to_char(Contact.birthday,
-                                                          '0MM-DD') <= days_limit.strftime(f"{slide}%m-%d")))
+                                                     db: AsyncSession) -> Optional[RowPage]: 
+    """To find contacts celebrating birthdays in the next (meantime) days (the nearest first)."""
+    # to_char(birthday, 'MM-DD') could not use an index, next_birthday (a date) is an indexed column
+    return await paginate_rows(db, select_rows()
+                               .filter(_birthday_within_days_filter(meantime))
+                               .order_by(Contact.next_birthday, Contact.id))
+
+
+async def search_by_birthday_celebration_within_days_keyset(meantime: int,
+                                                            params: CursorParams,
+                                                            db: AsyncSession) -> ContactCursorPage:
+    """To find contacts celebrating birthdays in the next (meantime) days (a page after the cursor)."""
+    return await paginate_keyset(db, select(Contact).filter(_birthday_within_days_filter(meantime)),
+                                 (Contact.next_birthday, Contact.id), params)
+
+
+EXPORT_COLUMNS = (Contact.id, Contact.name, Contact.last_name, Contact.email,
+                  Contact.phone, Contact.birthday, Contact.description)
+EXPORT_BATCH_SIZE = 1000  # rows per fetch from the server-side cursor (and per chunk of the response)
+
+
+def _export_chunk(rows: List[Any], fmt: str) -> str:
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    return ''.join(json.dumps(dict(row._mapping), default=date.isoformat, ensure_ascii=False) + '\n' for row in rows)
+
+
+async def export_contacts(filters: ExportFilters,
+                          fmt: str,
+                          db: AsyncSession) -> AsyncIterator[str]:
+    """To stream all (or the filtered) records as NDJSON or CSV lines. Plain rows, not ORM objects, are read from 
+    a server-side cursor (yield_per), so the memory does not depend on the number of rows."""
+    clauses = []
+    if filters.name:
+        clauses.append(_like_name(filters.name))
+    if filters.last_name:
+        clauses.append(_like_last_name(filters.last_name))
+    if filters.email:
+        clauses.append(_like_email(filters.email))
+    if filters.phone:
+        clauses.append(_like_phone(filters.phone))
+    if filters.birthday_within_days is not None:
+        clauses.append(_birthday_within_days_filter(filters.birthday_within_days))
+
+    if fmt == 'csv':
+        yield ','.join(column.key for column in EXPORT_COLUMNS) + '\r\n'
+
+    result = await db.stream(select(*EXPORT_COLUMNS)
+                             .filter(*clauses)
+                             .order_by(Contact.id)
+                             .execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions(EXPORT_BATCH_SIZE):
+        yield _export_chunk(rows, fmt)
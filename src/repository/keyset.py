@@ -0,0 +1,64 @@
+# keyset (cursor) пагінація: WHERE (name, id) > (:name, :id) ORDER BY name, id LIMIT :size
+import base64
+import binascii
+from datetime import date
+import json
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException, status
+from fastapi_pagination.ext.sqlalchemy import count_query
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schemes import ContactCursorPage, CursorParams
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Pack the sort key of the last row into an opaque (url-safe) string."""
+    return base64.urlsafe_b64encode(json.dumps(list(values), default=str).encode()).decode()
+
+
+def _column_value(column: Any, value: Any) -> Any:
+    """The value of the cursor as the type of the column (JSON has no dates: the values of Date columns
+    come back from YYYY-MM-DD), so a changed cursor is not compared with a column of another type.
+    The sort keys are NOT NULL: (key, id) > (NULL, id) would be true for no row."""
+    if value is None:
+        raise ValueError('NULL sort key')
+
+    python_type = column.type.python_type
+    return python_type.fromisoformat(value) if python_type is date else python_type(value)
+
+
+def decode_cursor(cursor: str, order_by: Sequence[Any]) -> List[Any]:
+    """Unpack the sort key from the cursor, 400 if the cursor was not made by encode_cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(values, list) and len(values) == len(order_by):
+            return [_column_value(column, value) for column, value in zip(order_by, values)]
+
+    except (binascii.Error, TypeError, ValueError):
+        pass
+
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+
+
+async def paginate_keyset(db: AsyncSession,
+                          query: Select,
+                          order_by: Sequence[Any],
+                          params: CursorParams) -> ContactCursorPage:
+    """The page after the cursor: no OFFSET, so page N costs the same as page 1 (with an index on order_by).
+    The last column of order_by must be unique (id), none may be NULL (a row compared with NULL is never
+    after the cursor), the total is counted only on request."""
+    total = await db.scalar(count_query(query)) if params.include_total else None
+
+    page_query = query.order_by(*order_by).limit(params.size + 1)  # 1 extra to check if there's a further page
+    if params.cursor:
+        page_query = page_query.where(tuple_(*order_by) > tuple_(*decode_cursor(params.cursor, order_by)))
+
+    items = (await db.execute(page_query)).scalars().all()
+    next_cursor = None
+    if len(items) > params.size:
+        items = items[:params.size]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in order_by])
+
+    return ContactCursorPage(items=items, next_cursor=next_cursor, total=total)
@@ -0,0 +1,65 @@
+# легкий шлях читання сторінок: кортежі колонок замість ORM-об'єктів, JSON без повторної валідації (orjson)
+import json
+from math import ceil
+from typing import Any, Sequence
+
+from fastapi_pagination.api import resolve_params
+from fastapi_pagination.ext.sqlalchemy import count_query, paginate_query
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Contact
+from src.schemes import ContactResponse
+
+try:
+    import orjson  # poetry install -E fast
+except ImportError:
+    orjson = None
+
+
+# the fields of the response in the order of ContactResponse (so the same JSON), then the version for the ETag
+RESPONSE_FIELDS = tuple(name for name, field in ContactResponse.__fields__.items() if not field.field_info.exclude)
+ROW_COLUMNS = tuple(getattr(Contact, name) for name in RESPONSE_FIELDS) + (Contact.version,)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON (as JSONResponse renders it), dates as YYYY-MM-DD."""
+    if orjson is not None:
+        return orjson.dumps(content)
+
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def select_rows() -> Select:
+    """SELECT of the response columns: rows are tuples, no ORM objects (identity map, instance state) are built."""
+    return select(*ROW_COLUMNS)
+
+
+class RowPage:
+    """Page[ContactResponse] of plain rows: the same JSON without ORM objects and without pydantic.
+    The rows come from the database, they were validated by ContactModel on the way in."""
+
+    def __init__(self, items: Sequence[Any], total: int, page: int, size: int) -> None:
+        self.items = items  # rows of ROW_COLUMNS (.id and .version for the ETag)
+        self.total = total
+        self.page = page
+        self.size = size
+        self.pages = ceil(total / size)
+
+    def render(self) -> bytes:
+        return dumps({
+            'items': [dict(zip(RESPONSE_FIELDS, row)) for row in self.items],  # zip stops before the version
+            'total': self.total,
+            'page': self.page,
+            'size': self.size,
+            'pages': self.pages,
+        })
+
+
+async def paginate_rows(db: AsyncSession, query: Select) -> RowPage:
+    """Like fastapi_pagination paginate (the page and size of the route, COUNT + LIMIT/OFFSET), for select_rows()."""
+    params = resolve_params()
+    total = await db.scalar(count_query(query))
+    rows = (await db.execute(paginate_query(query, params))).all()
+
+    return RowPage(rows, total, params.page, params.size)
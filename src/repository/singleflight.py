@@ -0,0 +1,99 @@
+# single-flight: однакові одночасні читання чекають на один запит до бази даних, а не виконують кожне свій
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from src.metrics import Counter, Gauge
+from src.settings import config
+
+
+single_flight_calls = Counter('db_single_flight_calls_total',
+                              'Repository reads by single-flight outcome: executed, coalesced (shared the result '
+                              'of a call in flight), overflow (the key table was full, not shared)',
+                              ('function', 'outcome'))
+single_flight_in_flight = Gauge('db_single_flight_in_flight', 'Shared calls (queries) in flight')
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one call in flight: the first one runs the query, the others wait
+    for its result (or its error) instead of taking a pooled connection each. Nothing is kept after the call
+    has finished - it is not a cache, a later call runs the query again.
+
+    The key table is bounded (max_keys): when it is full, a call with a new key just runs, not shared.
+    A call whose leader was cancelled (its client went away) runs the query itself."""
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.overflow = 0
+
+    async def do(self, key: Tuple[Hashable, ...], function: Callable[[], Awaitable[Any]]) -> Any:
+        """The result of function() - of this call, or of the one in flight with the same key (key[0]: its name)."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            single_flight_calls.inc(key[0], 'coalesced')
+            try:
+                return await asyncio.shield(future)  # this call may be cancelled, the shared one goes on
+
+            except asyncio.CancelledError:
+                if not future.cancelled():  # this call was cancelled, not the leader
+                    raise
+            return await function()
+
+        if len(self._calls) >= self.max_keys:
+            self.overflow += 1
+            single_flight_calls.inc(key[0], 'overflow')
+            return await function()
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        single_flight_in_flight.inc()
+        self.executed += 1
+        single_flight_calls.inc(key[0], 'executed')
+        try:
+            result = await function()
+
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # retrieved: no "exception was never retrieved" without the waiting calls
+            raise
+
+        else:
+            future.set_result(result)
+            return result
+
+        finally:
+            if self._calls.get(key) is future:  # not a new call after forget()
+                del self._calls[key]
+            single_flight_in_flight.dec()
+
+    def forget(self) -> None:
+        """After a write: the calls that come now run a new query (one started before the write may miss it),
+        the calls already waiting get the result they waited for."""
+        self._calls.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'overflow': self.overflow,
+            'in_flight': len(self._calls),
+            'max_keys': self.max_keys,
+        }
+
+
+def create_single_flight() -> Optional[SingleFlight]:
+    """[SINGLE_FLIGHT] in config.ini, None if it is disabled."""
+    if not config.getboolean('SINGLE_FLIGHT', 'enabled', fallback=False):
+        return None
+
+    return SingleFlight(max_keys=config.getint('SINGLE_FLIGHT', 'max_keys', fallback=1000))
+
+
+single_flight = create_single_flight()
@@ -1,61 +1,210 @@
 # Роутер(маршрут) для модуля contacts - містить точки доступу для операцій CRUD
-from typing import List, Optional
+from functools import partial
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi_pagination import Page, add_pagination  # , paginate  # poetry add fastapi-pagination
 # from fastapi_pagination.ext.async_sqlmodel import paginate
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db_connect import get_db
+from src.conditional import contact_etag, contact_response, if_match_versions, page_response
+from src.database.db_connect import get_db_session, get_read_db_session
 from src.database.models import Contact
+from src.repository import changes as repository_changes
 from src.repository import contacts as repository_contacts
-from src.schemes import ContactModel, ContactResponse, CatToNameModel
+from src.repository.bulk import iter_records
+from src.schemes import (
+    BatchIds,
+    BatchReport,
+    BatchUpdate,
+    BulkImportReport,
+    ChangeFeed,
+    ChangesParams,
+    ContactModel,
+    ContactPartialModel,
+    ContactResponse,
+    CatToNameModel,
+    ContactCursorPage,
+    CursorParams,
+    ExportFilters,
+    )
 
 
 router = APIRouter(prefix='/contacts')  # tags=["contacts"]
 
 
 # response_model=List[ContactResponse]   # limit: int = Query(10, le=500), offset: int = 0,
+# the pages (and single contacts) come with ETag: If-None-Match of an unchanged one - 304 Not Modified
 @router.get("/", response_model=Page[ContactResponse], tags=['all_contacts'])
-async def get_contacts(db: Session = Depends(get_db)) -> Optional[List[Contact]]:
-    contacts = await repository_contacts.get_contacts(db)  # limit, offset, 
+async def get_contacts(request: Request,
+                       db: AsyncSession = Depends(get_read_db_session)) -> Response:
 
-    return contacts
+    return await page_response(request, partial(repository_contacts.get_contacts, db))  # limit, offset, 
+
+
+@router.get("/search", response_model=Page[ContactResponse], tags=['search'])
+async def search(request: Request,
+                 q: str = Query(min_length=1, max_length=40, description='Part of a name, last name, email or phone'),
+                 db: AsyncSession = Depends(get_read_db_session)) -> Response:
+
+    return await page_response(request, partial(repository_contacts.search, q, db))
+
+
+# all (or the filtered) contacts in one streamed response, instead of walking the pages
+@router.get("/export", response_class=StreamingResponse, tags=['all_contacts'])
+async def export_contacts(fmt: str = Query('ndjson', regex='^(ndjson|csv)$'),
+                          filters: ExportFilters = Depends(),
+                          db: AsyncSession = Depends(get_read_db_session)) -> StreamingResponse:
+    media_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+
+    return StreamingResponse(repository_contacts.export_contacts(filters, fmt, db), media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="contacts.{fmt}"'})
+
+
+# the change feed: what changed after ?since=<seq> (a consumer keeps the last_seq), wait=N - long-polling;
+# from the primary: a replica may not have the change the long-poll was woken by
+@router.get("/changes", response_model=ChangeFeed, tags=['all_contacts'])
+async def get_changes(params: ChangesParams = Depends(),
+                      db: AsyncSession = Depends(get_db_session)) -> ChangeFeed:
+
+    return await repository_changes.get_changes(params, db)
+
+
+# keyset (cursor) pagination: no OFFSET and no COUNT(*) unless include_total
+@router.get("/keyset/", response_model=ContactCursorPage, tags=['all_contacts'])
+async def get_contacts_keyset(params: CursorParams = Depends(),
+                              db: AsyncSession = Depends(get_read_db_session)) -> ContactCursorPage:
+
+    return await repository_contacts.get_contacts_keyset(params, db)
+
+
+@router.get("/keyset/search_by_like_name/{name}", response_model=ContactCursorPage, tags=['search'])
+async def search_by_like_name_keyset(name: str,
+                                     params: CursorParams = Depends(),
+                                     db: AsyncSession = Depends(get_read_db_session)) -> ContactCursorPage:
+
+    return await repository_contacts.search_by_like_name_keyset(name, params, db)
+
+
+@router.get("/keyset/search_by_like_last_name/{last_name}", response_model=ContactCursorPage, tags=['search'])
+async def search_by_like_last_name_keyset(last_name: str,
+                                          params: CursorParams = Depends(),
+                                          db: AsyncSession = Depends(get_read_db_session)) -> ContactCursorPage:
+
+    return await repository_contacts.search_by_like_last_name_keyset(last_name, params, db)
+
+
+@router.get("/keyset/search_by_like_email/{email}", response_model=ContactCursorPage, tags=['search'])
+async def search_by_like_email_keyset(email: str,
+                                      params: CursorParams = Depends(),
+                                      db: AsyncSession = Depends(get_read_db_session)) -> ContactCursorPage:
+
+    return await repository_contacts.search_by_like_email_keyset(email, params, db)
+
+
+@router.get("/keyset/search_by_like_phone/{phone}", response_model=ContactCursorPage, tags=['search'])
+async def search_by_like_phone_keyset(phone: int,
+                                      params: CursorParams = Depends(),
+                                      db: AsyncSession = Depends(get_read_db_session)) -> ContactCursorPage:
+
+    return await repository_contacts.search_by_like_phone_keyset(phone, params, db)
+
+
+@router.get("/keyset/search_by_birthday_celebration_within_days/{days}", response_model=ContactCursorPage,
+            tags=['search'])
+async def search_by_birthday_celebration_within_days_keyset(days: int = Path(ge=0, le=366),
+                                                            params: CursorParams = Depends(),
+                                                            db: AsyncSession = Depends(get_read_db_session)
+                                                            ) -> ContactCursorPage:
+
+    return await repository_contacts.search_by_birthday_celebration_within_days_keyset(days, params, db)
+
+
+# batches of ids: one query (WHERE id = ANY) and one transaction instead of a request per id, a result per id
+@router.post("/batch_get", response_model=BatchReport, tags=['contact'])
+async def get_contacts_batch(body: BatchIds,
+                             db: AsyncSession = Depends(get_db_session)) -> BatchReport:
+
+    return await repository_contacts.get_contacts_batch(body.ids, db)
+
+
+@router.patch("/batch", response_model=BatchReport, tags=['contact'])
+async def update_contacts_batch(body: BatchUpdate,
+                                db: AsyncSession = Depends(get_db_session)) -> BatchReport:
+
+    return await repository_contacts.update_contacts_batch(body.items, db)
+
+
+@router.delete("/batch", response_model=BatchReport, tags=['contact'])
+async def remove_contacts_batch(body: BatchIds,
+                                db: AsyncSession = Depends(get_db_session)) -> BatchReport:
+
+    return await repository_contacts.remove_contacts_batch(body.ids, db)
 
 
 @router.get("/{contact_id}", response_model=ContactResponse, tags=['contact'])
-async def get_contact(contact_id: int = Path(ge=1),
-                      db: Session = Depends(get_db)) -> Optional[Contact]:
+async def get_contact(request: Request,
+                      contact_id: int = Path(ge=1),
+                      db: AsyncSession = Depends(get_db_session)) -> Response:
     contact = await repository_contacts.get_contact(contact_id, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+
+    return contact_response(request, contact)
 
 
 @router.post("/", response_model=ContactResponse,  status_code=status.HTTP_201_CREATED, tags=['contact'])
 async def create_contact(body: ContactModel,
-                         db: Session = Depends(get_db)) -> Optional[Contact]:
+                         db: AsyncSession = Depends(get_db_session)) -> Optional[Contact]:
 
     return await repository_contacts.create_contact(body, db)
 
 
+# body: NDJSON - a contact (JSON object) per line, or CSV with a header line (Content-Type: text/csv)
+@router.post("/bulk", response_model=BulkImportReport, tags=['contact'])
+async def create_contacts_bulk(request: Request,
+                               db: AsyncSession = Depends(get_db_session)) -> BulkImportReport:
+    fmt = 'csv' if request.headers.get('content-type', '').startswith('text/csv') else 'ndjson'
+
+    return await repository_contacts.create_contacts_bulk(iter_records(request.stream(), fmt), db)
+
+
+# If-Match: the ETag of the contact ("id.version") - the write is done only if nobody changed it since, else 412;
+# the response has the ETag of the new version (for the next If-Match)
 @router.put("/{contact_id}", response_model=ContactResponse, tags=['contact'])
 async def update_contact(body: ContactModel,
+                         request: Request,
+                         response: Response,
                          contact_id: int = Path(ge=1),
-                         db: Session = Depends(get_db)) -> Optional[Contact]:  # = Path(ge=1) ?
-    contact = await repository_contacts.update_contact(contact_id, body, db)
+                         db: AsyncSession = Depends(get_db_session)) -> Optional[Contact]:  # = Path(ge=1) ?
+    contact = await repository_contacts.update_contact(contact_id, body, db, if_match_versions(request, contact_id))
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
+
+    response.headers['ETag'] = contact_etag(contact)
+    return contact
+
+
+# only the fields that are in the body are changed
+@router.patch("/{contact_id}", response_model=ContactResponse, tags=['contact'])
+async def patch_contact(body: ContactPartialModel,
+                        request: Request,
+                        response: Response,
+                        contact_id: int = Path(ge=1),
+                        db: AsyncSession = Depends(get_db_session)):
+    contact = await repository_contacts.patch_contact(contact_id, body, db, if_match_versions(request, contact_id))
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
 
+    response.headers['ETag'] = contact_etag(contact)
     return contact
 
 
 # response_model=ContactResponse or status_code=status.HTTP_204_NO_CONTENT ? ...
 @router.delete("/{contact_id}", response_model=ContactResponse, tags=['contact'])
-async def remove_contact(contact_id: int = Path(ge=1),
-                         db: Session = Depends(get_db)):
-    contact = await repository_contacts.remove_contact(contact_id, db)
+async def remove_contact(request: Request,
+                         contact_id: int = Path(ge=1),
+                         db: AsyncSession = Depends(get_db_session)):
+    contact = await repository_contacts.remove_contact(contact_id, db, if_match_versions(request, contact_id))
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
     
@@ -64,103 +213,94 @@ async def remove_contact(contact_id: int = Path(ge=1),
 
 @router.patch("/{contact_id}/to_name", response_model=ContactResponse, tags=['contact'])
 async def change_name_contact(body: CatToNameModel,
+                              request: Request,
+                              response: Response,
                               contact_id: int = Path(ge=1),
-                              db: Session = Depends(get_db)):
-    contact = await repository_contacts.change_name_contact(body, contact_id, db)
+                              db: AsyncSession = Depends(get_db_session)):
+    contact = await repository_contacts.change_name_contact(body, contact_id, db,
+                                                            if_match_versions(request, contact_id))
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
 
+    response.headers['ETag'] = contact_etag(contact)
     return contact
 
 
 @router.get("/search_by_name/{name}", response_model=ContactResponse, tags=['search'])
-async def search_by_name(name: str,
-                         db: Session = Depends(get_db)):
+async def search_by_name(request: Request,
+                         name: str,
+                         db: AsyncSession = Depends(get_read_db_session)) -> Response:
     contact = await repository_contacts.search_by_name(name, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+
+    return contact_response(request, contact)
 
 
 @router.get("/search_by_last_name/{last_name}", response_model=ContactResponse, tags=['search'])
-async def search_by_last_name(last_name: str,
-                              db: Session = Depends(get_db)):
+async def search_by_last_name(request: Request,
+                              last_name: str,
+                              db: AsyncSession = Depends(get_read_db_session)) -> Response:
     contact = await repository_contacts.search_by_last_name(last_name, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+
+    return contact_response(request, contact)
 
 
 @router.get("/search_by_email/{email}", response_model=ContactResponse, tags=['search'])
-async def search_by_email(email: str,
-                          db: Session = Depends(get_db)):
+async def search_by_email(request: Request,
+                          email: str,
+                          db: AsyncSession = Depends(get_read_db_session)) -> Response:
     contact = await repository_contacts.search_by_email(email, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+
+    return contact_response(request, contact)
 
 
 @router.get("/search_by_phone/{phone}", response_model=ContactResponse, tags=['search'])  # ContactResponse
-async def search_by_phone(phone: int,
-                          db: Session = Depends(get_db)):
+async def search_by_phone(request: Request,
+                          phone: int,
+                          db: AsyncSession = Depends(get_read_db_session)) -> Response:
     contact = await repository_contacts.search_by_phone(phone, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+
+    return contact_response(request, contact)
 
 
 @router.get("/search_by_birthday_celebration_within_days/{days}", response_model=Page[ContactResponse], tags=['search'])
-async def search_by_birthday_celebration_within_days(days: int,
-                                                     db: Session = Depends(get_db)) -> Page[ContactResponse]:
-    contact = await repository_contacts.search_by_birthday_celebration_within_days(days, db)
-    if contact is None:  # NoConnection in database...
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact  # paginate(contact)
+async def search_by_birthday_celebration_within_days(request: Request,
+                                                     days: int = Path(ge=0, le=366),
+                                                     db: AsyncSession = Depends(get_read_db_session)) -> Response:
+    load = partial(repository_contacts.search_by_birthday_celebration_within_days, days, db)
+
+    return await page_response(request, load)  # paginate(contact)
 
 
 @router.get("/search_by_like_name/{name}", response_model=Page[ContactResponse], tags=['search'])
-async def search_by_like_name(name: str,
-                              db: Session = Depends(get_db)) -> Page[ContactResponse]:
-    contact = await repository_contacts.search_by_like_name(name, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+async def search_by_like_name(request: Request,
+                              name: str,
+                              db: AsyncSession = Depends(get_read_db_session)) -> Response:
+
+    return await page_response(request, partial(repository_contacts.search_by_like_name, name, db))
 
 
 @router.get("/search_by_like_last_name/{last_name}", response_model=Page[ContactResponse], tags=['search'])
-async def search_by_like_last_name(last_name: str,
-                                   db: Session = Depends(get_db)) -> Page[ContactResponse]:
-    contact = await repository_contacts.search_by_like_last_name(last_name, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+async def search_by_like_last_name(request: Request,
+                                   last_name: str,
+                                   db: AsyncSession = Depends(get_read_db_session)) -> Response:
+
+    return await page_response(request, partial(repository_contacts.search_by_like_last_name, last_name, db))
 
 
 @router.get("/search_by_like_email/{email}", response_model=Page[ContactResponse], tags=['search'])
-async def search_by_like_email(email: str,
-                               db: Session = Depends(get_db)) -> Page[ContactResponse]:
-    contact = await repository_contacts.search_by_like_email(email, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+async def search_by_like_email(request: Request,
+                               email: str,
+                               db: AsyncSession = Depends(get_read_db_session)) -> Response:
+
+    return await page_response(request, partial(repository_contacts.search_by_like_email, email, db))
 
 
 @router.get("/search_by_like_phone/{phone}", response_model=Page[ContactResponse], tags=['search'])
-async def search_by_like_phone(phone: int,
-                               db: Session = Depends(get_db)) -> Page[ContactResponse]:
-    contact = await repository_contacts.search_by_like_phone(phone, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact Not Found")
-    
-    return contact
+async def search_by_like_phone(request: Request,
+                               phone: int,
+                               db: AsyncSession = Depends(get_read_db_session)) -> Response:
+
+    return await page_response(request, partial(repository_contacts.search_by_like_phone, phone, db))
 
 
 add_pagination(router)
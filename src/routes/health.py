@@ -0,0 +1,23 @@
+# Роутер для перевірок стану: liveness (процес відповідає) та readiness (база даних доступна)
+from fastapi import APIRouter, Response, status
+
+from src.database.health import database_health
+
+
+router = APIRouter(prefix='/health', tags=['health'])
+
+
+# liveness: no database, no pool - a restart would not help a database outage
+@router.get("/live")
+async def liveness() -> dict:
+    return {'status': 'alive'}
+
+
+# readiness: out of the balancer while the database is unreachable (503), back in when it answers
+@router.get("/ready")
+async def readiness(response: Response) -> dict:
+    if await database_health.ready():
+        return {'status': 'ready', **database_health.stats()}
+
+    response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {'status': 'not ready', **database_health.stats()}
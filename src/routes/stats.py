@@ -0,0 +1,45 @@
+# Роутер для службової статистики (кеш, пул з'єднань, ...)
+from fastapi import APIRouter
+
+from src.cache import contact_cache
+from src.database.db_connect import database, offload_enabled, offload_executor
+from src.database.monitoring import pool_stats
+from src.repository.singleflight import single_flight
+
+
+router = APIRouter(prefix='/stats', tags=['stats'])
+
+
+@router.get("/cache")
+async def cache_stats() -> dict:
+    if contact_cache is None:
+        return {'enabled': False}
+
+    return {'enabled': True, **contact_cache.stats()}
+
+
+# identical concurrent reads: executed (queries) / coalesced (waited for one of them) / overflow (key table full)
+@router.get("/single_flight")
+async def single_flight_stats() -> dict:
+    if single_flight is None:
+        return {'enabled': False}
+
+    return {'enabled': True, **single_flight.stats()}
+
+
+# the pool of the engine the requests use (async, or sync in the offload mode) and of the other one, and the replicas
+@router.get("/pool")
+async def connection_pool_stats() -> dict:
+    result = {'mode': 'offload' if offload_enabled else 'async'}
+    if database.async_engine is not None:
+        result['async'] = pool_stats(database.async_engine.sync_engine)
+    if database.engine is not None:
+        result['sync'] = pool_stats(database.engine)
+    if offload_enabled:
+        result['offload'] = {'pending': offload_executor.pending,
+                             'workers': offload_executor.workers,
+                             'queue_depth': offload_executor.queue_depth}
+    if database.replicas:
+        result['replicas'] = database.replicas.stats()
+
+    return result
@@ -1,6 +1,9 @@
 # Схеми для валідації вхідних та вихідних даних
-from datetime import date
-from pydantic import BaseModel, Field, EmailStr  # poetry add pydantic[email] 
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+from fastapi import Query
+from pydantic import BaseModel, Field, EmailStr, validator  # poetry add pydantic[email] 
 
 
 class ContactModel(BaseModel):
@@ -14,6 +17,9 @@ class ContactModel(BaseModel):
 
 class ContactResponse(ContactModel):
     id: int = 1 
+    # the row version for ETag / Last-Modified: read from the record, not a part of the response
+    version: int = Field(default=1, exclude=True)
+    updated_at: Optional[datetime] = Field(default=None, exclude=True)
 
     class Config:
         orm_mode = True
@@ -21,3 +27,109 @@ class ContactResponse(ContactModel):
 
 class CatToNameModel(BaseModel):
     name: str = Field(default='Unknown-next', min_length=2, max_length=30)
+
+
+class ContactPartialModel(BaseModel):  # only the fields that are set are changed (.dict(exclude_unset=True))
+    name: Optional[str] = Field(default=None, min_length=2, max_length=30)
+    last_name: Optional[str] = Field(default=None, min_length=2, max_length=40)
+    email: Optional[EmailStr] = None
+    phone: Optional[int] = Field(default=None, gt=0, le=9999999999)
+    birthday: Optional[date] = None
+    description: Optional[str] = Field(default=None, max_length=3000)
+
+    @validator('*')
+    def not_null(cls, value: Any) -> Any:  # a set field can't be null: the columns are NOT NULL (or the data)
+        if value is None:
+            raise ValueError('may be omitted, but not null')
+        return value
+
+
+BATCH_MAX_SIZE = 1000  # ids (items) per batch request: one array parameter, one statement
+
+
+def _unique_ids(ids: List[int]) -> List[int]:
+    if len(set(ids)) != len(ids):
+        raise ValueError('ids must be unique')
+    return ids
+
+
+class BatchIds(BaseModel):
+    ids: List[int] = Field(min_items=1, max_items=BATCH_MAX_SIZE)
+
+    _unique = validator('ids', allow_reuse=True)(_unique_ids)
+
+
+class BatchUpdateItem(ContactPartialModel):
+    id: int = Field(ge=1)
+
+
+class BatchUpdate(BaseModel):
+    items: List[BatchUpdateItem] = Field(min_items=1, max_items=BATCH_MAX_SIZE)
+
+    @validator('items')
+    def unique_items(cls, items: List[BatchUpdateItem]) -> List[BatchUpdateItem]:
+        _unique_ids([item.id for item in items])
+        return items
+
+
+class CursorParams(BaseModel):  # Depends() like fastapi_pagination.Params
+    cursor: Optional[str] = Query(None, description='Opaque cursor from the previous page (next_cursor)')
+    size: int = Query(50, ge=1, le=100, description='Page size')
+    include_total: bool = Query(False, description='Also count all matching rows (one more query)')
+
+
+class ExportFilters(BaseModel):  # Depends(): the same predicates as the search_by_like_* / birthday routes
+    name: Optional[str] = Query(None, description='Part of the name')
+    last_name: Optional[str] = Query(None, description='Part of the last name')
+    email: Optional[str] = Query(None, description='Part of the email')
+    phone: Optional[int] = Query(None, description='Part of the phone')
+    birthday_within_days: Optional[int] = Query(None, ge=0, le=366, description='Birthday in the next (days) days')
+
+
+class ChangesParams(BaseModel):  # Depends(): GET /contacts/changes
+    since: int = Query(0, ge=0, description='seq of the last change received (0: from the first one)')
+    limit: int = Query(100, ge=1, le=1000, description='At most (limit) changes')
+    wait: float = Query(0, ge=0, le=30, description='Seconds to wait for a change if there is none yet (long-polling)')
+
+
+class ContactCursorPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class BulkRowResult(BaseModel):
+    row: int  # number of the data row (line) in the uploaded file, from 1
+    status: str  # duplicate / invalid
+    detail: Any = None
+
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: str  # found / updated / deleted / not_found
+    contact: Optional[ContactResponse] = None
+
+
+class BatchReport(BaseModel):  # a result per requested id, in the order of the request
+    results: List[BatchItemResult] = []
+
+
+class BulkImportReport(BaseModel):
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    rows: List[BulkRowResult] = []  # only the rows that were not created
+
+
+class ContactChangeResponse(BaseModel):
+    seq: int
+    contact_id: int
+    op: str  # create / update / delete
+    version: int
+    changed_at: datetime
+    contact: Optional[ContactResponse] = None  # the record after the change, None for a delete
+
+
+class ChangeFeed(BaseModel):  # in commit order: the next request is ?since=last_seq
+    changes: List[ContactChangeResponse] = []
+    last_seq: int
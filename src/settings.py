@@ -0,0 +1,26 @@
+# налаштування: config.ini + змінні оточення (CONTACTS__SECTION__OPTION), пароль - з оточення або файлу-секрету
+import configparser  # for work with *.ini (config.ini)
+import os
+import pathlib
+
+
+CONFIG_FILE = pathlib.Path(__file__).parent.joinpath('config.ini')
+ENV_PREFIX = 'CONTACTS__'  # CONTACTS__DB_POOL__SIZE=20 -> [DB_POOL] SIZE=20
+
+
+def load_config() -> configparser.ConfigParser:
+    """config.ini (or the file in CONTACTS_CONFIG), then the options from the environment over it.
+    Only reads: no prompts, no connections - so it is safe at import time."""
+    config_ = configparser.ConfigParser()
+    config_.read(os.environ.get('CONTACTS_CONFIG', CONFIG_FILE))
+    for name, value in os.environ.items():
+        section, _, option = name[len(ENV_PREFIX):].partition('__') if name.startswith(ENV_PREFIX) else ('', '', '')
+        if section and option:
+            if not config_.has_section(section):
+                config_.add_section(section)
+            config_.set(section, option, value.replace('%', '%%'))  # no interpolation of the values
+
+    return config_
+
+
+config = load_config()
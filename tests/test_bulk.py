@@ -0,0 +1,54 @@
+# масовий імпорт: рядки NDJSON/CSV з потоку тіла запиту
+import asyncio
+
+from src.repository.bulk import iter_records
+
+
+async def _stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def records(fmt: str, *chunks: bytes) -> list:
+    async def collect():
+        return [record async for record in iter_records(_stream(*chunks), fmt)]
+
+    return asyncio.run(collect())
+
+
+def test_ndjson_lines_split_across_chunks():
+    result = records('ndjson', b'{"name": "A"}\r\n{"na', b'me": "\xc3', b'\xa9"}')  # a character split, too
+
+    assert result == [(1, {'name': 'A'}), (2, {'name': 'é'})]
+
+
+def test_ndjson_broken_lines_are_reported_by_row():
+    result = records('ndjson', b'{"name": "A"}\n\n{oops\n[1, 2]\n\xff\xfe\n{"name": "B"}\n')
+
+    assert [row for row, _ in result] == [1, 2, 3, 4, 5]  # the empty line is not a row
+    assert result[0] == (1, {'name': 'A'})
+    assert result[1][1].startswith('Invalid JSON')
+    assert result[2][1] == 'Expected a JSON object'
+    assert result[3][1].startswith('Invalid UTF-8')
+    assert result[4] == (5, {'name': 'B'})
+
+
+def test_csv_header_and_empty_cells():
+    assert records('csv', b'name, email ,phone\nA,a@b.c,\n"B, jr",b@b.c,123\n') == [
+        (1, {'name': 'A', 'email': 'a@b.c'}),
+        (2, {'name': 'B, jr', 'email': 'b@b.c', 'phone': '123'}),
+    ]
+
+
+def test_csv_broken_rows():
+    result = records('csv', b'name,email\nA\n\xffB,b@b.c\nC,c@b.c\n')
+
+    assert result[0] == (1, 'Expected 2 values, got 1')
+    assert result[1][0] == 2 and result[1][1].startswith('Invalid UTF-8')
+    assert result[2] == (3, {'name': 'C', 'email': 'c@b.c'})
+
+
+def test_csv_broken_header_stops_the_import():
+    result = records('csv', b'\xffname,email\nA,a@b.c\n')
+
+    assert len(result) == 1 and result[0][0] == 0 and result[0][1].startswith('Invalid UTF-8')
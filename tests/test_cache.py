@@ -0,0 +1,141 @@
+# кеш контактів: LRU + TTL, вказівники полів пошуку на id, інвалідація
+import asyncio
+import configparser
+from datetime import date
+
+import pytest
+
+from src import cache as cache_module
+from src.cache import ContactCache, create_contact_cache, create_page_cache, LocalSharedBackend, LRUCache
+from src.schemes import ContactResponse
+
+
+def contact(contact_id: int = 1, email: str = 'ann@example.com', version: int = 1) -> ContactResponse:
+    return ContactResponse(id=contact_id, name='Ann', last_name='Lee', email=email, phone=contact_id,
+                           birthday=date(2000, 1, 1), version=version)
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' is the least recently used now
+    cache.set('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.evictions == 1 and len(cache) == 2
+
+
+def test_lru_expires_after_ttl():
+    cache = LRUCache(max_size=10, ttl=-1)  # expired as soon as it is set
+    cache.set('a', 1)
+
+    assert cache.get('a') is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+
+def test_put_and_get_by_pointer():
+    async def scenario():
+        cache = ContactCache(LRUCache(max_size=10, ttl=60), LocalSharedBackend())
+        await cache.put(contact(), 'email')
+        return await cache.get(1), await cache.get_by('email', 'ann@example.com'), await cache.get_by('email', 'x@y.z')
+
+    by_id, by_email, unknown = asyncio.run(scenario())
+    assert by_id == contact() and by_email == contact() and unknown is None
+
+
+def test_invalidate_id_makes_the_pointers_miss():
+    async def scenario():
+        cache = ContactCache(LRUCache(max_size=10, ttl=60), LocalSharedBackend())
+        await cache.put(contact(), 'email')
+        await cache.invalidate(contact(email='new@example.com', version=2))  # as it was written
+        missed = await cache.get_by('email', 'ann@example.com')
+        # the email was changed: the old pointer leads to a contact with another email
+        await cache.put(contact(email='new@example.com', version=2), 'email')
+        stale = await cache.get_by('email', 'ann@example.com')
+        return missed, stale, await cache.get_by('email', 'new@example.com')
+
+    missed, stale, found = asyncio.run(scenario())
+    assert missed is None and stale is None
+    assert found.version == 2
+
+
+def test_shared_backend_fills_the_local_cache():
+    async def scenario():
+        shared = LocalSharedBackend()
+        writer = ContactCache(LRUCache(max_size=10, ttl=60), shared)
+        reader = ContactCache(LRUCache(max_size=10, ttl=60), shared)
+        await writer.put(contact(1), 'email')
+        await writer.put(contact(2, email='bob@example.com'))
+        found = await reader.get_many([1, 2, 3])
+        return found, len(reader.local), reader.stats()
+
+    found, local_size, stats = asyncio.run(scenario())
+    assert sorted(found) == [1, 2] and found[1].version == 1
+    assert local_size == 2 and (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_put_after_an_invalidation_is_skipped():
+    async def scenario():
+        cache = ContactCache(LRUCache(max_size=10, ttl=60))
+        generation = cache.generation  # taken before the read
+        await cache.invalidate(contact(version=2))  # a write commits while the read runs
+        await cache.put(contact(), generation=generation)
+        return await cache.get(1), cache.skipped_puts
+
+    assert asyncio.run(scenario()) == (None, 1)
+
+
+def test_older_version_from_another_worker_is_not_put():
+    async def scenario():
+        shared = LocalSharedBackend()
+        reader = ContactCache(LRUCache(max_size=10, ttl=60), shared)
+        writer = ContactCache(LRUCache(max_size=10, ttl=60), shared)
+        generation = reader.generation  # the read of version 1 starts in one worker
+        await writer.invalidate(contact(version=2))  # version 2 is written in another one
+        await reader.put(contact(version=1), generation=generation)  # the generation of the reader has not changed
+        stale = await writer.get(1)
+        await reader.put(contact(version=2))
+        return stale, (await writer.get(1)).version, reader.skipped_puts
+
+    assert asyncio.run(scenario()) == (None, 2, 1)
+
+
+def test_deleted_contact_is_not_put_back():
+    async def scenario():
+        shared = LocalSharedBackend()
+        reader = ContactCache(LRUCache(max_size=10, ttl=60), shared)
+        writer = ContactCache(LRUCache(max_size=10, ttl=60), shared)
+        await writer.invalidate(contact(version=3), deleted=True)
+        await reader.put(contact(version=3))  # read just before the delete
+        return await writer.get(1), reader.skipped_puts
+
+    assert asyncio.run(scenario()) == (None, 1)
+
+
+@pytest.mark.parametrize('workers, shared_url, created', [
+    ('1', '', True),
+    ('1', 'local', True),
+    ('4', '', False),  # an invalidation would reach one worker of four
+    ('4', 'local', False),
+])
+def test_no_local_only_cache_with_several_workers(monkeypatch, workers, shared_url, created):
+    config = configparser.ConfigParser()
+    config.read_dict({'CACHE': {'enabled': 'yes', 'shared_url': shared_url}, 'SERVER': {'workers': workers}})
+    monkeypatch.setattr(cache_module, 'config', config)
+
+    assert (create_contact_cache() is not None) == created
+
+
+@pytest.mark.parametrize('workers, shared_url, created', [
+    ('1', '', True),
+    ('4', '', False),  # a write would clear the pages of one worker of four
+    ('4', 'local', False),
+    ('4', 'redis://localhost:6379/0', cache_module.redis is not None),
+])
+def test_no_page_cache_with_several_workers_without_redis(monkeypatch, workers, shared_url, created):
+    config = configparser.ConfigParser()
+    config.read_dict({'CACHE': {'pages': 'yes', 'shared_url': shared_url}, 'SERVER': {'workers': workers}})
+    monkeypatch.setattr(cache_module, 'config', config)
+
+    assert (create_page_cache() is not None) == created
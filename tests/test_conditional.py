@@ -0,0 +1,67 @@
+# умовні запити: ETag, If-Match (версії запису), If-None-Match та If-Modified-Since
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.conditional import contact_response, if_match_versions
+from src.schemes import ContactResponse
+
+
+def request(**headers: str) -> Request:
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'',
+                    'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]})
+
+
+def test_no_if_match():
+    assert if_match_versions(request(), 7) is None
+
+
+@pytest.mark.parametrize('header, versions', [
+    ('"7.3"', [3]),
+    ('"7.3", "7.4"', [3, 4]),
+    ('"8.1", "7.2"', [2]),  # the tags of other contacts are ignored
+    ('W/"7.3", "7.5"', [5]),  # weak tags never match
+    ('*', None),
+    ('"7.2", *', None),
+])
+def test_if_match_versions(header, versions):
+    assert if_match_versions(request(if_match=header), 7) == versions
+
+
+@pytest.mark.parametrize('header', ['"8.3"', 'W/"7.3"', '"7.x"', '"7"', '7.3', ''])
+def test_if_match_without_a_tag_of_the_contact(header):
+    with pytest.raises(HTTPException) as error:
+        if_match_versions(request(if_match=header), 7)
+
+    assert error.value.status_code == 412
+
+
+def contact(updated_at: datetime) -> ContactResponse:
+    return ContactResponse(id=7, name='Ann', last_name='Lee', email='ann@example.com', phone=1,
+                           birthday='2000-01-01', version=3, updated_at=updated_at)
+
+
+def test_last_modified_in_gmt_for_any_time_zone():
+    updated_at = datetime(2026, 1, 1, 12, 0, 0, 500, tzinfo=timezone(timedelta(hours=3)))  # a non-UTC session
+    response = contact_response(request(), contact(updated_at))
+
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] == 'Thu, 01 Jan 2026 09:00:00 GMT'
+    assert response.headers['ETag'] == '"7.3"'
+
+
+@pytest.mark.parametrize('headers, status_code', [
+    ({'if_none_match': '"7.3"'}, 304),
+    ({'if_none_match': '"7.2"'}, 200),
+    ({'if_modified_since': 'Thu, 01 Jan 2026 09:00:00 GMT'}, 304),
+    ({'if_modified_since': 'Thu, 01 Jan 2026 08:59:59 GMT'}, 200),
+    ({'if_modified_since': 'Thu, 01 Jan 2026 12:00:00 +0300'}, 304),
+    ({'if_modified_since': 'not a date'}, 200),
+    ({'if_none_match': '"7.2"', 'if_modified_since': 'Thu, 01 Jan 2026 09:00:00 GMT'}, 200),  # If-None-Match first
+])
+def test_not_modified(headers, status_code):
+    updated_at = datetime(2026, 1, 1, 12, 0, 0, 500, tzinfo=timezone(timedelta(hours=3)))
+
+    assert contact_response(request(**headers), contact(updated_at)).status_code == status_code
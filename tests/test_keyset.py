@@ -0,0 +1,90 @@
+# keyset (cursor) пагінація: курсор - ключ сортування останнього рядка сторінки
+import asyncio
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Contact
+from src.database.offload import BoundedExecutor, OffloadSession
+from src.repository.keyset import decode_cursor, encode_cursor, paginate_keyset
+from src.schemes import CursorParams
+
+
+BY_NAME = (Contact.name, Contact.id)
+BY_BIRTHDAY = (Contact.next_birthday, Contact.id)
+
+
+@pytest.mark.parametrize('order_by, values', [
+    (BY_NAME, ['Ann', 41]),
+    (BY_NAME, ['Ann "Jr" ü/+?', 5]),
+    (BY_BIRTHDAY, [date(2027, 2, 28), 3]),
+])
+def test_cursor_round_trip(order_by, values):
+    cursor = encode_cursor(values)
+
+    assert decode_cursor(cursor, order_by) == values
+    assert not set(cursor) & set('+/?&')  # goes into the query string as is
+
+
+@pytest.mark.parametrize('order_by, cursor', [
+    (BY_NAME, 'not base64 !'),
+    (BY_NAME, ''),
+    (BY_NAME, encode_cursor(['Ann'])),  # not the number of the columns
+    (BY_NAME, encode_cursor(['Ann', 'abc'])),  # not an id
+    (BY_NAME, encode_cursor(['Ann', [1]])),
+    (BY_NAME, encode_cursor([None, 7])),  # a NULL key: no row is after it, the paging would end
+    (BY_BIRTHDAY, encode_cursor(['not a date', 3])),
+    (BY_BIRTHDAY, encode_cursor([20270228, 3])),
+])
+def test_changed_cursor_is_400(order_by, cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, order_by)
+
+    assert error.value.status_code == 400
+
+
+@pytest.fixture
+def engine():
+    """The contacts table of the model in an in-memory database, shared with the thread of the offload pool."""
+    engine_ = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Contact.__table__.create(engine_)
+    yield engine_
+    engine_.dispose()
+
+
+def contact_rows(*names) -> list:
+    return [{'id': contact_id, 'name': name, 'last_name': f'Last{contact_id}', 'email': f'{contact_id}@example.com',
+             'phone': contact_id, 'birthday': date(2000, 1, contact_id), 'description': '-', 'version': 1}
+            for contact_id, name in enumerate(names, start=1)]
+
+
+def test_null_name_is_rejected(engine):
+    """(name, id) > (:name, :id) is NULL for a NULL name: such a row would be on no page after the first."""
+    with pytest.raises(IntegrityError), engine.begin() as connection:
+        connection.execute(insert(Contact), contact_rows('Ann', None))
+
+
+def test_every_row_is_on_a_page(engine):
+    with engine.begin() as connection:
+        connection.execute(insert(Contact), contact_rows('Bob', 'Ann', 'Ann', 'Cid', 'Ann', 'Bob', 'Al'))
+
+    async def read_all_pages(db: OffloadSession) -> list:
+        ids, cursor = [], None
+        while True:
+            page = await paginate_keyset(db, select(Contact), BY_NAME, CursorParams(cursor=cursor, size=2))
+            ids += [contact.id for contact in page.items]
+            cursor = page.next_cursor
+            if cursor is None:
+                return ids
+
+    executor = BoundedExecutor(workers=1, queue_depth=10)
+    with Session(engine) as session:
+        ids = asyncio.run(read_all_pages(OffloadSession(session, executor)))
+    executor.shutdown()
+
+    assert ids == [7, 2, 3, 5, 1, 6, 4]  # by name, by id within the same name
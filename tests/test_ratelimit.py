@@ -0,0 +1,104 @@
+# обмеження запитів: token bucket (поповнення, ціна маршруту) та обмеження одночасних запитів
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src import ratelimit
+from src.ratelimit import LocalBucketBackend, RateLimitMiddleware
+
+
+class Clock:
+    """time.monotonic of the rate limiter, moved by the test."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock_ = Clock()
+    monkeypatch.setattr(ratelimit, 'time', clock_)
+    return clock_
+
+
+def take(backend: LocalBucketBackend, key: str = 'ip:1', cost: float = 1) -> float:
+    return asyncio.run(backend.take(key, cost, rate=2, burst=4))
+
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    backend = LocalBucketBackend(max_clients=10)
+    assert [take(backend) for _ in range(4)] == [0, 0, 0, 0]  # the burst
+    assert take(backend) == pytest.approx(0.5)  # 1 token at 2 per second
+
+    clock.now += 0.5
+    assert take(backend) == 0
+    assert take(backend) == pytest.approx(0.5)
+
+    clock.now += 3600  # no more than the burst however long it waits
+    assert [take(backend) for _ in range(5)] == [0, 0, 0, 0, pytest.approx(0.5)]
+
+
+def test_bucket_per_client_and_cost(clock):
+    backend = LocalBucketBackend(max_clients=10)
+    assert take(backend, 'ip:1', cost=3) == 0
+    assert take(backend, 'ip:1', cost=3) == pytest.approx(1.0)  # 1 token left, 2 more at 2 per second
+    assert take(backend, 'ip:2', cost=3) == 0
+
+
+def test_least_recently_used_bucket_is_dropped(clock):
+    backend = LocalBucketBackend(max_clients=2)
+    take(backend, 'ip:1', cost=4)
+    take(backend, 'ip:2', cost=4)
+    take(backend, 'ip:3', cost=4)  # ip:1 is dropped
+
+    assert take(backend, 'ip:1', cost=4) == 0  # starts anew with a full bucket
+    assert take(backend, 'ip:3', cost=4) > 0
+
+
+def client_of(costs: dict) -> TestClient:
+    app = FastAPI()
+
+    @app.get('/api/contacts/search')
+    async def search():
+        return {}
+
+    @app.get('/api/contacts/{contact_id}')
+    async def get_contact(contact_id: int):
+        return {}
+
+    @app.get('/api/health/live')
+    async def live():
+        return {}
+
+    app.add_middleware(RateLimitMiddleware, router=app.router, backend=LocalBucketBackend(max_clients=10),
+                       rate=1, burst=10, costs=costs, exempt=('/api/health',))
+    return TestClient(app)
+
+
+def test_route_cost(clock):
+    client = client_of({'/api/contacts/search': 5, '/api/contacts/{contact_id}': 1})
+
+    assert [client.get('/api/contacts/search').status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get('/api/contacts/1').status_code == 429  # the bucket of the client is empty
+    assert client.get('/api/contacts/1', headers={'X-API-Key': 'other'}).status_code == 200  # another client
+
+
+def test_rejected_with_retry_after(clock):
+    client = client_of({'/api/contacts/search': 10})
+    client.get('/api/contacts/search')
+    response = client.get('/api/contacts/search')
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
+    assert client.get('/api/health/live').status_code == 200  # exempt
+
+
+def test_cost_above_burst_still_passes_with_a_full_bucket(clock):
+    client = client_of({'/api/contacts/search': 50})
+
+    assert client.get('/api/contacts/search').status_code == 200
@@ -0,0 +1,100 @@
+# репліки для читання: по черзі (round-robin), без тих, що недавно впали
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from src.database.offload import BoundedExecutor, OffloadSession
+from src.database.replicas import is_replica, Replica, ReplicaReadSession, ReplicaSet
+
+
+@pytest.fixture
+def replicas():
+    """Three replicas: the engines connect only on the first use, so no server is needed."""
+    replicas_ = [Replica(name, f'postgresql+psycopg2://user:password@{name}/contacts',
+                         f'postgresql+asyncpg://user:password@{name}/contacts', {}, connect_timeout=1)
+                 for name in ('r1', 'r2', 'r3')]
+    yield replicas_
+    for replica in replicas_:
+        replica.engine.dispose()
+
+
+def first_names(replica_set: ReplicaSet, count: int) -> list:
+    return [next(replica_set.candidates()).name for _ in range(count)]
+
+
+def test_round_robin(replicas):
+    replica_set = ReplicaSet(replicas, retry_after=30)
+
+    assert first_names(replica_set, 4) == ['r1', 'r2', 'r3', 'r1']
+    assert [replica.name for replica in replica_set.candidates()] == ['r2', 'r3', 'r1']  # the others in turn
+
+
+def test_marked_down_is_skipped_until_retry_after(replicas):
+    replica_set = ReplicaSet(replicas, retry_after=30)
+    replica_set.mark_down(replicas[1], ConnectionError('refused'))
+
+    assert first_names(replica_set, 3) == ['r1', 'r3', 'r3']
+    assert replicas[1].failures == 1 and not replicas[1].healthy
+
+    replicas[1].down_until = time.monotonic() - 1  # retry_after has passed
+    assert replicas[1].healthy
+    assert [replica.name for replica in replica_set.candidates()] == ['r1', 'r2', 'r3']
+
+
+def test_no_healthy_replica(replicas):
+    replica_set = ReplicaSet(replicas, retry_after=30)
+    for replica in replicas:
+        replica_set.mark_down(replica, ConnectionError('refused'))
+
+    assert list(replica_set.candidates()) == []
+    assert not ReplicaSet([], retry_after=30)  # no replicas configured: the reads go to the primary
+
+
+def test_replica_sessions_are_marked(replicas):
+    assert is_replica(replicas[0].session())
+    assert is_replica(replicas[0].async_session())
+
+
+@pytest.fixture
+def executor():
+    executor_ = BoundedExecutor(workers=1, queue_depth=10)
+    yield executor_
+    executor_.shutdown()
+
+
+def test_read_session_connects_at_the_first_query(replicas, executor):
+    """The hosts of the replicas do not exist: the first query marks them down in turn and runs on the primary."""
+    primary = create_engine('sqlite://')
+    replica_set = ReplicaSet(replicas, retry_after=30)
+    opened = []
+
+    def open_session(replica):
+        opened.append(replica.name if replica is not None else 'primary')
+        return OffloadSession(replica.session() if replica is not None else Session(primary), executor)
+
+    async def scenario():
+        db = ReplicaReadSession(replica_set, open_session)
+        assert is_replica(db) and opened == ['r1']
+        assert replica_set.replicas[0].engine.pool.checkedout() == 0  # no connection until a query
+        value = await db.scalar(text('SELECT 7'))
+        await db.close()
+        return value, is_replica(db)
+
+    assert asyncio.run(scenario()) == (7, False)
+    assert opened == ['r1', 'r2', 'r3', 'primary']
+    assert [replica.failures for replica in replicas] == [1, 1, 1] and replica_set.primary_reads == 1
+    primary.dispose()
+
+
+def test_read_session_without_a_query_opens_no_connection(replicas, executor):
+    replica_set = ReplicaSet(replicas, retry_after=30)
+
+    async def scenario():
+        db = ReplicaReadSession(replica_set, lambda replica: OffloadSession(replica.session(), executor))
+        await db.close()  # e.g. a 304: nothing was read
+
+    asyncio.run(scenario())
+    assert all(replica.healthy and replica.failures == 0 and replica.reads == 0 for replica in replicas)
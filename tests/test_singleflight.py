@@ -0,0 +1,132 @@
+# single-flight: однакові одночасні читання чекають на один запит
+import asyncio
+
+from src.repository.singleflight import SingleFlight
+
+
+class Query:
+    """A query that runs until the test lets it finish, and counts how many times it was run."""
+
+    def __init__(self, result='rows') -> None:
+        self.result = result
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+async def settle() -> None:
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_query():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=10), Query()
+        calls = [asyncio.create_task(flight.do(('get_contact', 1), query)) for _ in range(5)]
+        await settle()
+        query.release.set()
+        results = await asyncio.gather(*calls)
+        return results, query.calls, flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ['rows'] * 5 and calls == 1
+    assert (stats['executed'], stats['coalesced'], stats['in_flight']) == (1, 4, 0)
+
+
+def test_different_keys_and_later_calls_are_not_shared():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=10), Query()
+        query.release.set()
+        await asyncio.gather(flight.do(('get_contact', 1), query), flight.do(('get_contact', 2), query))
+        await flight.do(('get_contact', 1), query)  # not a cache: the first call has finished
+        return query.calls
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_error_is_shared():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=10), Query(LookupError('no database'))
+        calls = [asyncio.create_task(flight.do(('search', 'ann'), query)) for _ in range(3)]
+        await settle()
+        query.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True), query.calls
+
+    results, calls = asyncio.run(scenario())
+    assert calls == 1 and all(isinstance(result, LookupError) for result in results)
+
+
+def test_cancelled_leader_the_followers_run_the_query():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=10), Query()
+        leader = asyncio.create_task(flight.do(('get_contact', 1), query))
+        await settle()
+        followers = [asyncio.create_task(flight.do(('get_contact', 1), query)) for _ in range(2)]
+        await settle()
+        leader.cancel()  # its client went away
+        await settle()
+        query.release.set()
+        return await asyncio.gather(*followers), leader.cancelled(), query.calls
+
+    results, cancelled, calls = asyncio.run(scenario())
+    assert results == ['rows', 'rows'] and cancelled
+    assert calls == 3  # the leader, then each follower for itself
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=10), Query()
+        leader = asyncio.create_task(flight.do(('get_contact', 1), query))
+        await settle()
+        follower = asyncio.create_task(flight.do(('get_contact', 1), query))
+        await settle()
+        follower.cancel()
+        await settle()
+        query.release.set()
+        return await leader, follower.cancelled()
+
+    assert asyncio.run(scenario()) == ('rows', True)
+
+
+def test_full_key_table_runs_unshared():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=1), Query()
+        calls = [asyncio.create_task(flight.do(('get_contact', contact_id), query)) for contact_id in (1, 2, 2)]
+        await settle()
+        query.release.set()
+        await asyncio.gather(*calls)
+        return query.calls, flight.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == 3 and (stats['executed'], stats['overflow']) == (1, 2)
+
+
+def test_forget_after_a_write():
+    async def scenario():
+        flight, old, new = SingleFlight(max_keys=10), Query('old'), Query('new')
+        before = asyncio.create_task(flight.do(('get_contact', 1), old))
+        await settle()
+        flight.forget()  # a write has committed: the next call must not get the old read
+        after = asyncio.create_task(flight.do(('get_contact', 1), new))
+        await settle()
+        old.release.set()
+        new.release.set()
+        return await before, await after, flight.stats()['in_flight']
+
+    assert asyncio.run(scenario()) == ('old', 'new', 0)
+
+
+def test_no_keys_nothing_shared():
+    async def scenario():
+        flight, query = SingleFlight(max_keys=0), Query()
+        query.release.set()
+        await asyncio.gather(*(flight.do(('get_contact', 1), query) for _ in range(3)))
+        return query.calls
+
+    assert asyncio.run(scenario()) == 3
@@ -0,0 +1,67 @@
+# пошук за підрядком: запити репозиторію (ILIKE '%x%') мають йти по GIN (gin_trgm_ops) індексах, а не перебором таблиці
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from src.database.db_connect import database_url, has_trigram
+from src.database.models import Contact
+from src.repository.contacts import _like_email, _like_last_name, _like_name, _like_phone, _search_query
+from src.repository.rows import select_rows
+
+
+# the trigram indexes of the model: {name: column}
+TRIGRAM_INDEXES = {index.name: index.expressions[0].name for index in Contact.__table__.indexes
+                   if index.dialect_options['postgresql']['using'] == 'gin'}
+
+LIKE_FILTERS = [
+    (_like_name, 'nna', 'ix_contacts_name_trgm'),
+    (_like_last_name, 'ee', 'ix_contacts_last_name_trgm'),
+    (_like_email, '@example', 'ix_contacts_email_trgm'),
+    (_like_phone, 123, 'ix_contacts_phone_text_trgm'),
+]
+
+
+@pytest.fixture(scope='module')
+def connection():
+    """The database of config.ini, migrated (alembic upgrade head); the test is skipped without it or pg_trgm."""
+    try:
+        engine = create_engine(database_url())
+        connection_ = engine.connect()
+    except (OperationalError, RuntimeError) as error:
+        pytest.skip(f'No PostgreSQL: {error}')
+
+    indexes = connection_.exec_driver_sql("SELECT indexname FROM pg_indexes WHERE tablename = 'contacts'").scalars()
+    if not set(TRIGRAM_INDEXES) <= set(indexes):
+        connection_.close()
+        pytest.skip('No trigram indexes (a server without pg_trgm, or not migrated)')
+
+    connection_.exec_driver_sql('SET enable_seqscan = off')  # a small test table would be read by a seq scan
+    yield connection_
+    connection_.rollback()
+    connection_.close()
+    engine.dispose()
+
+
+def explain(connection, statement) -> str:
+    """The plan of the statement as the application sends it (the parameters are bound by the driver)."""
+    compiled = statement.compile(connection)
+    return '\n'.join(connection.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params).scalars())
+
+
+def test_pg_trgm_is_detected(connection):
+    assert has_trigram(connection.engine)
+
+
+def test_every_trigram_index_is_in_the_model():
+    assert set(TRIGRAM_INDEXES.values()) == {'name', 'last_name', 'email', 'phone_text'}
+
+
+@pytest.mark.parametrize('like, part, index', LIKE_FILTERS)
+def test_substring_search_uses_trigram_index(connection, like, part, index):
+    plan = explain(connection, select_rows().filter(like(part)))
+    assert f'Bitmap Index Scan on {index}' in plan, plan
+
+
+def test_search_uses_all_trigram_indexes(connection):
+    plan = explain(connection, _search_query('ann', trigram=True))
+    assert all(f'Bitmap Index Scan on {index}' in plan for index in TRIGRAM_INDEXES), plan